@@ -0,0 +1,162 @@
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from recommender import (
+    DB_NAME, VACATION_FACTORS, EMIGRATION_FACTORS, SIGNED_FACTORS,
+    load_feature_store, load_factors, _candidate_rows, _factor_vector
+)
+
+#RANK STABILITY OF A USER'S TOP DESTINATIONS
+#POINTS OF EVERY FACTOR DEPEND ONLY ON THE PREFERENCES, WEIGHTS JUST COMBINE THEM, SO THE FACTOR MATRIX IS COMPUTED ONCE AND
+#THOUSANDS OF PERTURBED WEIGHT VECTORS ARE SCORED WITH ONE (SAMPLES x FACTORS) @ (FACTORS x DESTINATIONS) PRODUCT
+#SAMPLES ARE SCORED IN BLOCKS OF ABOUT THIS MANY (SAMPLE, DESTINATION) CELLS
+ANALYSIS_BLOCK_CELLS = 1 << 22
+#SKYLINE CANDIDATES ARE COMPARED WITH THE FRONTIER IN BLOCKS OF THIS MANY DESTINATIONS
+SKYLINE_BLOCK = 256
+
+
+def factor_matrix(store, mode, preferences, rows):
+    """Factors x candidates matrix of 0-1 points (a factor which cannot be scored gives zeros)."""
+    factors = VACATION_FACTORS if mode == 'vacation' else EMIGRATION_FACTORS
+    load_factors(store, factors)
+    all_rows = len(rows) == len(store['names'])
+    matrix = np.zeros((len(factors), len(rows)))
+    for i, factor in enumerate(factors):
+        points = _factor_vector(store, mode, factor, preferences, rows, all_rows)
+        if points is not None:
+            matrix[i] = points
+    return matrix
+
+def perturbed_weights(mode, weights, samples, spread, rng):
+    """Samples x factors weights: the user's weights plus normal noise, clipped to the range of the sliders.
+
+    A factor only adds points while its weight is positive (popularity also when negative), like in the recommender.
+    """
+    factors = VACATION_FACTORS if mode == 'vacation' else EMIGRATION_FACTORS
+    base = np.array([weights.get(f, 0) for f in factors], dtype=float)
+    lower = np.array([-1.0 if f in SIGNED_FACTORS else 0.0 for f in factors])
+    sampled = np.clip(base + rng.normal(0.0, spread, (samples, len(factors))), lower, 1.0)
+    return np.where(lower < 0, sampled, np.maximum(sampled, 0.0))
+
+def sample_ranks(matrix, sampled_weights, tie_order):
+    """Samples x candidates rank (1 = best) of every candidate for every weight vector, equal scores are ordered by tie_order."""
+    order = np.argsort(tie_order, kind='stable')
+    ranks = np.empty((len(sampled_weights), matrix.shape[1]), dtype=np.int32)
+    block = max(ANALYSIS_BLOCK_CELLS // max(matrix.shape[1], 1), 1)
+    for start in range(0, len(sampled_weights), block):
+        scores = (sampled_weights[start:start + block] @ matrix)[:, order]
+        best_first = order[np.argsort(-scores, axis=1, kind='stable')]
+        np.put_along_axis(ranks[start:start + block], best_first, np.arange(1, matrix.shape[1] + 1, dtype=np.int32)[None, :], axis=1)
+    return ranks
+
+def rank_stability(mode, preferences, weights, samples=2000, spread=0.1, top_n=10, interval=0.9, seed=None, db_path=DB_NAME):
+    """Per destination: rank with the user's weights, probability of being in the top_n when the weights are perturbed,
+    and the median rank with its interval (the central share of the sampled ranks given by interval).
+
+    Sorted by the user's ranking, None if the database could not be read.
+    """
+    try:
+        store = load_feature_store(db_path)
+    except Exception as e:
+        print(f"Error loading data from database: {e}")
+        return None
+    rng = np.random.default_rng(seed)
+    rows = _candidate_rows(store, preferences)
+    matrix = factor_matrix(store, mode, preferences, rows)
+    user_weights = perturbed_weights(mode, weights, 1, 0.0, rng)
+    ranks = sample_ranks(matrix, np.vstack([user_weights, perturbed_weights(mode, weights, samples, spread, rng)]), store['name_rank'][rows])
+    user_rank, ranks = ranks[0], ranks[1:]
+    tail = (1 - interval) / 2
+    low, median, high = np.quantile(ranks, [tail, 0.5, 1 - tail], axis=0, method='inverted_cdf')
+    country_col = 'Country_x' if mode == 'vacation' else 'Country'
+    results = store['names'].iloc[rows].rename(columns={'Country': country_col})
+    results['rank'] = user_rank
+    results['p_top_n'] = (ranks <= top_n).mean(axis=0)
+    results['median_rank'] = median.astype(int)
+    results['rank_low'] = low.astype(int)
+    results['rank_high'] = high.astype(int)
+    return results.sort_values('rank')
+
+
+#SKYLINE (PARETO FRONTIER)
+#DESTINATIONS WHICH NO OTHER DESTINATION BEATS ON EVERY SELECTED FACTOR, WITHOUT ANY WEIGHTS. SORT-FILTER-SKYLINE: AFTER SORTING BY
+#THE SUM OF POINTS A DESTINATION CAN ONLY BE DOMINATED BY ONE BEFORE IT, SO EVERY BLOCK IS ONLY COMPARED WITH THE FRONTIER SO FAR
+def _dominated(a, b):
+    """Mask of the rows of b which some row of a dominates (at least as good on every column and better on one)."""
+    at_least = (a[:, None, :] >= b[None, :, :]).all(axis=2)
+    better = (a[:, None, :] > b[None, :, :]).any(axis=2)
+    return (at_least & better).any(axis=0)
+
+def skyline_rows(points):
+    """Positions of the rows of points (rows x factors, higher is better) which are not dominated, best sum of points first."""
+    #EQUAL SUMS (ALSO AFTER ROUNDING) ARE ORDERED BY THE POINTS THEMSELVES, SO A DOMINATING ROW ALWAYS COMES FIRST
+    order = np.lexsort([-points[:, i] for i in reversed(range(points.shape[1]))] + [-points.sum(axis=1)])
+    frontier = np.empty(0, dtype=int)
+    for start in range(0, len(order), SKYLINE_BLOCK):
+        block = order[start:start + SKYLINE_BLOCK]
+        block = block[~_dominated(points[frontier], points[block])]
+        #DOMINANCE IS TRANSITIVE, SO INSIDE THE BLOCK IT IS ENOUGH THAT NO ROW DOMINATES IT
+        block = block[~_dominated(points[block], points[block])]
+        frontier = np.concatenate([frontier, block])
+    return frontier
+
+def skyline(mode, preferences, factors, db_path=DB_NAME):
+    """Destinations not dominated on the given factors, with their 0-1 points of every factor (as used by the recommender).
+
+    None if the database could not be read.
+    """
+    factor_order = VACATION_FACTORS if mode == 'vacation' else EMIGRATION_FACTORS
+    unknown = [f for f in factors if f not in factor_order]
+    if unknown:
+        raise ValueError(f"Unknown {mode} factors: {', '.join(unknown)}")
+    try:
+        store = load_feature_store(db_path)
+    except Exception as e:
+        print(f"Error loading data from database: {e}")
+        return None
+    rows = _candidate_rows(store, preferences)
+    all_rows = len(rows) == len(store['names'])
+    load_factors(store, factors)
+    columns = {}
+    for factor in factors:
+        points = _factor_vector(store, mode, factor, preferences, rows, all_rows)
+        if points is None:
+            raise ValueError(f"Factor {factor} cannot be scored without its preferences")
+        columns[factor] = points
+    points = np.column_stack([columns[f] for f in factors]) if factors else np.zeros((len(rows), 0))
+    frontier = skyline_rows(points)
+    country_col = 'Country_x' if mode == 'vacation' else 'Country'
+    results = store['names'].iloc[rows[frontier]].rename(columns={'Country': country_col})
+    for i, factor in enumerate(factors):
+        results[factor] = points[frontier, i]
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="How stable the top destinations are when the weights are perturbed, "
+                                     "or (with --skyline) the destinations not dominated on the given factors.")
+    parser.add_argument('mode', choices=['vacation', 'emigration'])
+    parser.add_argument('request', help='JSON file with {"preferences": {...}, "weights": {...}}')
+    parser.add_argument('--skyline', nargs='+', metavar='FACTOR', help="factors of the skyline (the weights are not used)")
+    parser.add_argument('--samples', type=int, default=2000)
+    parser.add_argument('--spread', type=float, default=0.1, help="standard deviation of the noise added to every weight")
+    parser.add_argument('-n', '--top-n', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--db', default=DB_NAME, help="database file")
+    args = parser.parse_args()
+
+    with open(args.request, encoding='utf-8') as f:
+        request = json.load(f)
+    pd.set_option('display.width', 200)
+    if args.skyline:
+        results = skyline(args.mode, request.get('preferences', {}), args.skyline, args.db)
+        if results is not None:
+            print(results.to_string(index=False))
+    else:
+        results = rank_stability(args.mode, request.get('preferences', {}), request.get('weights', {}), args.samples, args.spread,
+                                 args.top_n, seed=args.seed, db_path=args.db)
+        if results is not None:
+            print(results.head(2 * args.top_n).to_string(index=False))
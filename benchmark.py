@@ -0,0 +1,222 @@
+import argparse
+import json
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import recommender as rec
+from chatbot import get_chatbot_response, classify_question
+
+#MICROBENCHMARKS OF THE RECOMMENDER HOT PATHS
+#EVERY STAGE IS TIMED SEVERAL TIMES AND THEN RUN ONCE MORE UNDER tracemalloc FOR ITS PEAK MEMORY (TRACING SLOWS IT DOWN)
+TABLES = ['destinations', 'attractions', 'destination_aggregates', 'destination_group_masks']
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
+#PREFERENCES USED WITH EVERY PERSONA (VACATION IS ALSO RUN FOR EVERY MONTH)
+VACATION_PREFERENCES = {'weather': 'warm', 'attractions': ['Top_200_Popular', 'Museums', 'Beach'], 'known_languages': ['English'], 'excluded_places': []}
+EMIGRATION_PREFERENCES = {'weather': 'comfortable', 'known_languages': ['English'], 'excluded_places': []}
+CHATBOT_QUESTIONS = ['hello', 'help', 'tell me about Rome', 'what is the safety in Berlin', 'hdi in Spain', 'weather in Paris in July',
+                     'most popular attraction in Barcelona', 'show me flights to Vienna', 'what are weights', 'something else entirely',
+                     'destinations near Vienna']
+#INPUT FILES OF database_creator.py
+INGEST_INPUTS = ["destinations_important_14_07_wersja_python_1.xlsx - Attractions.csv",
+                 "destinations_important_14_07_wersja_python_1.xlsx - Country_Statistics.csv",
+                 "destinations_important_14_07_wersja_python_1.xlsx - Destination_Countries.csv",
+                 "destinations_important_14_07_wersja_python_1.xlsx - Destination_Statistics.csv"]
+#A STAGE IS A REGRESSION WHEN ITS MEDIAN IS THIS MUCH SLOWER THAN THE BASELINE (AND AT LEAST MIN_REGRESSION_MS SLOWER)
+REGRESSION_TOLERANCE = 0.2
+MIN_REGRESSION_MS = 0.05
+
+
+class Recorder:
+    """Collects timing samples and peak memory of named stages."""
+
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.samples = {}
+        self.peaks = {}
+
+    def run(self, stage, fn, repeat=None, setup=None):
+        """Times fn, if setup is given its result is made before every run (untimed) and passed to fn."""
+        for _ in range(repeat or self.repeat):
+            args = () if setup is None else (setup(),)
+            start = time.perf_counter()
+            result = fn(*args)
+            self.samples.setdefault(stage, []).append(time.perf_counter() - start)
+        args = () if setup is None else (setup(),)
+        tracemalloc.start()
+        try:
+            fn(*args)
+            self.peaks[stage] = max(self.peaks.get(stage, 0), tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+        return result
+
+    def summary(self):
+        rows = [{'stage': stage, 'runs': len(samples), 'median_ms': float(np.median(samples) * 1000),
+                 'p95_ms': float(np.percentile(samples, 95) * 1000), 'peak_kib': self.peaks[stage] / 1024}
+                for stage, samples in self.samples.items()]
+        return pd.DataFrame(rows).set_index('stage')
+
+
+def cases():
+    """(mode, persona, preferences, weights) of every persona, vacation personas in every month."""
+    for persona, weights in rec.VACATION_PRESETS.items():
+        for month in MONTHS:
+            yield 'vacation', f"{persona} / {month}", {**VACATION_PREFERENCES, 'month': month}, weights
+    for persona, weights in rec.EMIGRATION_PRESETS.items():
+        yield 'emigration', persona, EMIGRATION_PREFERENCES, weights
+
+def read_sqlite(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return {table: pd.read_sql_query(f"SELECT * FROM {table}", conn) for table in TABLES}
+    finally:
+        conn.close()
+
+def memory_tables(db_path):
+    """The tables the app keeps in memory, from the snapshot and from SQLite (both with the compact schema)."""
+    tables = read_sqlite(db_path)
+    frames = {}
+    for table in ['destinations', 'attractions']:
+        frames[f"{table} (snapshot)"] = rec.apply_compact_schema(rec.read_table(table, db_path), table)
+        frames[f"{table} (sqlite)"] = rec.apply_compact_schema(tables[table], table)
+    return frames
+
+def run_ingest(recorder, repeat):
+    #database_creator.py IS A SCRIPT WHICH WRITES NEXT TO ITSELF, SO IT IS RUN ON A COPY OF ITS INPUTS
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in INGEST_INPUTS + ['database_creator.py', 'recommender.py', 'snapshot.py']:
+            shutil.copy(name, tmp)
+        command = [sys.executable, 'database_creator.py']
+        recorder.samples['ingest'] = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=tmp, check=True, stdout=subprocess.DEVNULL)
+            recorder.samples['ingest'].append(time.perf_counter() - start)
+        #PEAK MEMORY OF THE WHOLE PROCESS IS NOT TRACED, ONLY REPORTED AS UNKNOWN
+        recorder.peaks['ingest'] = float('nan')
+
+def run_benchmarks(repeat=20, db_path=rec.DB_NAME, ingest=False):
+    recorder = Recorder(repeat)
+
+    #DB LOAD
+    recorder.run('db_load.sqlite', lambda: read_sqlite(db_path))
+    recorder.run('db_load.snapshot', lambda: {table: rec.read_table(table, db_path) for table in TABLES})
+    all_factors = list(dict.fromkeys(rec.VACATION_FACTORS + rec.EMIGRATION_FACTORS))
+    def build_store():
+        store = rec.build_feature_store(db_path)
+        rec.load_factors(store, all_factors)
+        return store
+    store = recorder.run('feature_store', build_store)
+
+    #AGGREGATES (WHAT database_creator.py MATERIALISES)
+    df_dest, df_attr = rec.read_table('destinations', db_path), rec.read_table('attractions', db_path)
+    recorder.run('popularity_ranking', lambda: rec.attraction_popularity_points(df_attr['No_votes']))
+    recorder.run('aggregates_groupby', lambda: rec.build_destination_aggregates(df_dest, df_attr))
+
+    #FACTOR BLOCKS ON A FRESH STORE (THE COLUMNS OF THE FACTOR ARE READ AND PRECOMPUTED), WITH THE FIRST PERSONA OF EVERY MODE
+    first_cases = {}
+    for mode, _, preferences, _ in cases():
+        first_cases.setdefault(mode, preferences)
+    for mode, preferences in first_cases.items():
+        factors = rec.VACATION_FACTORS if mode == 'vacation' else rec.EMIGRATION_FACTORS
+        rows = rec._candidate_rows(store, preferences)
+        all_rows = len(rows) == len(store['names'])
+        for number, factor in enumerate(factors, start=1):
+            recorder.run(f"{mode}.{number}_{factor}.fresh", lambda fresh: rec._factor_vector(fresh, mode, factor, preferences, rows, all_rows),
+                         setup=lambda: rec.build_feature_store(db_path))
+
+    #FACTOR BLOCKS AND SORT, FOR EVERY PERSONA AND MONTH, ON THE STORE WITH EVERY FACTOR ALREADY LOADED
+    for mode, _, preferences, weights in cases():
+        factors = rec.VACATION_FACTORS if mode == 'vacation' else rec.EMIGRATION_FACTORS
+        rows = rec._candidate_rows(store, preferences)
+        all_rows = len(rows) == len(store['names'])
+        score = np.zeros(len(rows))
+        for number, factor in enumerate(factors, start=1):
+            if not rec._is_active(factor, weights.get(factor, 0)):
+                continue
+            points = recorder.run(f"{mode}.{number}_{factor}.cached", lambda: rec._factor_vector(store, mode, factor, preferences, rows, all_rows))
+            if points is not None:
+                score += weights[factor] * points
+        recorder.run(f"{mode}.sort", lambda: rec.top_k(score, store['name_rank'][rows], 10))
+
+    #END TO END (RESULT CACHE CLEARED, SO EVERY CALL IS SCORED) AND A CACHE HIT
+    for mode, _, preferences, weights in cases():
+        recommend = rec.get_vacation_recommendations if mode == 'vacation' else rec.get_emigration_recommendations
+        def cold():
+            rec.clear_result_cache()
+            return recommend(preferences, weights, db_path=db_path)
+        recorder.run(f"{mode}.end_to_end", cold, repeat=3)
+        recorder.run(f"{mode}.cached", lambda: recommend(preferences, weights, db_path=db_path), repeat=3)
+
+    #CHATBOT
+    dest = rec.apply_compact_schema(df_dest, 'destinations')
+    attr = rec.apply_compact_schema(df_attr, 'attractions')
+    countries = sorted(dest['Country'].astype(str).unique())
+    destinations = sorted(dest['Destination'].astype(str).unique())
+    for question in CHATBOT_QUESTIONS:
+        recorder.run('chatbot', lambda: get_chatbot_response(question, dest, attr, destinations, countries, MONTHS))
+        recorder.run('chatbot.intent', lambda: classify_question(question.lower()))
+
+    if ingest:
+        run_ingest(recorder, max(1, repeat // 10))
+    return recorder.summary()
+
+def compare(summary, baseline):
+    """Summary with the baseline medians next to it and a regression flag."""
+    base = pd.DataFrame(baseline['stages']).T[['median_ms']].rename(columns={'median_ms': 'baseline_ms'})
+    table = summary.join(base, how='left')
+    table['ratio'] = table['median_ms'] / table['baseline_ms']
+    table['regression'] = ((table['median_ms'] > table['baseline_ms'] * (1 + REGRESSION_TOLERANCE)) &
+                           (table['median_ms'] - table['baseline_ms'] > MIN_REGRESSION_MS))
+    return table
+
+def save_baseline(summary, path):
+    baseline = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__, 'machine': platform.machine(),
+        'stages': json.loads(summary.to_json(orient='index')),
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times the stages of the recommender (median, p95 and peak memory of every stage).")
+    parser.add_argument('--repeat', type=int, default=20, help="runs of every stage which is not timed per persona")
+    parser.add_argument('--db', default=rec.DB_NAME, help="database file")
+    parser.add_argument('--ingest', action='store_true', help="also time database_creator.py (slow)")
+    parser.add_argument('--save', metavar='PATH', help="save the results as a JSON baseline")
+    parser.add_argument('--compare', metavar='PATH', help="compare with a saved baseline, the exit code is 1 if a stage regressed")
+    parser.add_argument('--memory', action='store_true', help="only report the memory of the app tables (shared memory maps and private copies)")
+    args = parser.parse_args()
+
+    if args.memory:
+        print(rec.memory_report(memory_tables(args.db)).to_string(index=False))
+        sys.exit(0)
+
+    summary = run_benchmarks(args.repeat, args.db, args.ingest)
+    pd.set_option('display.width', 200)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            table = compare(summary, json.load(f))
+        print(table.round(3).to_string())
+        regressed = table.index[table['regression']].tolist()
+        if regressed:
+            print(f"\nRegressions (median more than {REGRESSION_TOLERANCE:.0%} slower): {', '.join(regressed)}")
+    else:
+        print(summary.round(3).to_string())
+    if args.save:
+        save_baseline(summary, args.save)
+        print(f"\nBaseline saved to {args.save}")
+    if args.compare and regressed:
+        sys.exit(1)
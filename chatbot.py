@@ -0,0 +1,274 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from recommender import build_spatial_index, within_radius, nearest_rows, haversine_km
+
+#HOW MANY DESTINATIONS "NEAR X" LISTS
+NEARBY_COUNT = 5
+#SPATIAL INDEX OF THE LAST DESTINATIONS TABLE (THE APP PASSES THE SAME CACHED TABLE WITH EVERY QUESTION)
+_SPATIAL_INDEX = {}
+#DESTINATION AND COUNTRY MATCHERS OF THE LAST TABLE, REBUILT WHEN THE TABLE OR THE NUMBER OF NAMES CHANGES
+_ENTITY_MATCHERS = {}
+
+#INTENT ROUTING: EVERY KEYWORD IN THE TABLES BELOW IS FOUND BY TWO COMPILED ALTERNATIONS (PLAIN KEYWORDS AND PATTERNS), THEN THE
+#INTENTS ARE CHECKED IN PRIORITY ORDER AGAINST THE SET OF FOUND KEYWORDS, SO A NEW INTENT DOES NOT ADD ANOTHER SCAN OF THE QUESTION
+GREETINGS = ['hello', 'hi', 'hey']
+#METRICS OF THE DATA LOOKUP INTENT: KEYWORD -> (COLUMN, FORMAT), IN PRIORITY ORDER
+DATA_KEYWORDS = {
+    "hdi": ("HDI_Value_Latest", ".3f"),
+    "safety": ("Safety_Index", ".2f"),
+    "cost of living": ("CostofLivingPlusRentIndex", ".2f"),
+    "purchasing power": ("LocalPurchasingPowerIndex", ".2f"),
+    "unemployment": ("Unemployment_Rate_National_Latest_Pct", ".2f"),
+    "inflation": ("Inflation_Rate_National_Latest_Pct", ".2f"),
+    "life expectancy": ("Life_Expectancy", ".2f"),
+    "cuisine rank": ("Cuisine_Rank", ".0f"),
+}
+#ANSWERS OF THE EXPLANATION INTENTS (QUESTIONS WITHOUT A DESTINATION OR COUNTRY), THE FIRST KEYWORD FOUND WINS
+EXPLANATIONS = {
+    "weights": "A higher weight gives a factor more influence on the final recommendation score, allowing you to match the results to what's most important to you.",
+    "model": "The model uses a Weighted Scoring System. For each destination, it calculates a score (from 0 to 1) for various factors like weather, budget, and safety. Each score is then multiplied by its user-defined weight. The final score is the sum of all these weighted scores, and the top 10 destinations are recommended.",
+    "hdi": "The Human Development Index (HDI) is a statistical composite index of life expectancy, education, and per capita income indicators, which is used to rank countries into four tiers of human development. It provides a broader measure of development than just economic factors, reflecting the overall quality of life in a country.",
+    "safety": "Safety Index is a measure of how safe a country or city is for residents and visitors. It takes into account factors like crime rates, political stability, healthcare quality, and emergency services. A higher Safety Index indicates a safer environment.",
+    "cost of living": "Cost of Living Index measures the relative cost of living in different locations. It includes expenses like housing, food, transportation, healthcare, and entertainment. A lower index means that living in that location is generally more affordable.",
+    "purchasing power": "Purchasing Power Index indicates how much a local currency can buy in terms of goods and services. It reflects the relative value of money in a specific location, showing how far a salary can go in that area. A higher index means that your money has more purchasing power.",
+    "cuisine rank": "Cuisine Rank is a measure of the quality and diversity of a destination's food scene. It considers factors like the variety of cuisines available, the number of high-rated restaurants, and the overall culinary experience. A higher rank indicates a more vibrant and appealing food culture.",
+    "weather": "In this model, weather is categorized into five types: cold, cool, mild, warm, and hot. Each destination is rated based on its typical weather conditions during different months of the year. This helps match your preferred climate with destinations that are likely to offer that experience.",
+    "attraction": "Attractions refer to points of interest that draw visitors to a destination. They can include natural sites like parks and beaches, cultural landmarks like museums and historic sites, entertainment venues like theme parks and theaters, and many other types of places that offer unique experiences.",
+    "distance": "Distance in this model refers to the road distance from Lodz, Poland to the destination. It is used as a factor to prefer closer destinations, which can be more convenient and cost-effective to travel to.",
+    "known languages": "Known Languages refers to the languages that you, the user, can speak. If you know the local language of a destination, it gives that destination a significant bonus in its recommendation score, as it can enhance your experience and ease of communication while traveling.",
+    "attraction quantity": "Attraction Quantity measures the number of attractions in a destination that match your interests. A higher quantity indicates that there are more options for things to see and do that align with what you enjoy.",
+    "attraction quality": "Attraction Quality assesses how highly-rated the attractions in a destination are, based on user reviews and ratings. A higher quality score means that the attractions you are interested in are generally well-regarded and likely to provide a better experience.",
+    "attraction popularity": "Attraction Popularity indicates how well-known and frequently visited the attractions in a destination are. A higher popularity score means that the destination has famous landmarks and sites that attract many tourists, while a lower score may indicate hidden gems and less crowded places.",
+    "cuisine quality": "Cuisine Quality evaluates the overall quality of the food scene in a destination, based on factors like restaurant ratings, diversity of culinary options, and local food culture. A higher cuisine quality score suggests that the destination offers a rich and satisfying dining experience.",
+}
+#KEYWORDS OF THE OTHER INTENTS
+INTENT_KEYWORDS = ['help', 'most popular', 'attraction', 'tell me about', 'weather', 'flight', 'hotel', 'wikipedia', 'information']
+#KEYWORDS WHICH ARE PATTERNS RATHER THAN PLAIN TEXT. GREETINGS ARE WHOLE WORDS ("hi" WOULD MATCH INSIDE "which" OR "within"),
+#THEIR LAST LETTER MAY BE REPEATED ("hellooo", "heyyy")
+KEYWORD_PATTERNS = {'within': r'within \d+(?:\.\d+)? ?km', 'near': r'\b(?:near|nearby|close to)\b',
+                    **{word: rf'\b{word}+\b' for word in GREETINGS}}
+RADIUS_PATTERN = re.compile(r'within (\d+(?:\.\d+)?) ?km')
+
+
+def compile_keywords(plain, patterns):
+    """Router of the intent keywords: plain keywords and {keyword: pattern} are matched in separate passes, so a keyword
+    of one kind never hides a keyword of the other one starting at the same position.
+    """
+    plain = list(dict.fromkeys(plain))
+    #AT EVERY POSITION THE LONGEST PLAIN KEYWORD MATCHES, THE SHORTER ONES STARTING THERE ARE ADDED FROM THE KEYWORDS INSIDE IT
+    longest_first = sorted(plain, key=len, reverse=True)
+    return {
+        'plain': re.compile('(?=(' + '|'.join(map(re.escape, longest_first)) + '))'),
+        'implied': {keyword: {other for other in plain if other in keyword} for keyword in plain},
+        #WHERE ANY PATTERN MATCHES, EVERY PATTERN IS TRIED AT THAT POSITION
+        'patterns': re.compile('(?=' + '|'.join(f'(?:{source})' for source in patterns.values()) + ')'),
+        'pattern_keywords': {keyword: re.compile(source) for keyword, source in patterns.items()},
+    }
+
+KEYWORD_ROUTER = compile_keywords(INTENT_KEYWORDS + list(DATA_KEYWORDS) + list(EXPLANATIONS), KEYWORD_PATTERNS)
+
+# --- Chatbot Logic ---
+def _spatial_index(dest_data):
+    if _SPATIAL_INDEX.get('data') is not dest_data:
+        lat = pd.to_numeric(dest_data['Latitude'], errors='coerce').to_numpy(dtype=float)
+        lon = pd.to_numeric(dest_data['Longitude'], errors='coerce').to_numpy(dtype=float)
+        _SPATIAL_INDEX.update(data=dest_data, index=build_spatial_index(lat, lon))
+    return _SPATIAL_INDEX['index']
+
+def nearby_destinations(dest_data, destination, radius_km=None, count=NEARBY_COUNT):
+    """Other destinations within radius_km of a destination, or the count nearest ones, nearest first, as (name, country, km)."""
+    index = _spatial_index(dest_data)
+    row = np.flatnonzero((dest_data['Destination'] == destination).to_numpy())[0]
+    lat, lon = index['lat'][row], index['lon'][row]
+    if np.isnan(lat) or np.isnan(lon):
+        return None
+    rows = within_radius(index, lat, lon, radius_km) if radius_km is not None else nearest_rows(index, lat, lon, count + 1)
+    rows = rows[rows != row]
+    distances = haversine_km(index['lat'][rows], index['lon'][rows], lat, lon)
+    order = np.argsort(distances, kind='stable')[:count if radius_km is None else None]
+    return [(str(dest_data['Destination'].iloc[rows[i]]), str(dest_data['Country'].iloc[rows[i]]), distances[i]) for i in order]
+
+def build_entity_matcher(entity_list):
+    """Aho-Corasick automaton of the lowercased entity names, so a question is matched against all of them in one pass."""
+    goto, fail, matches = [{}], [0], [[]]
+    for position, entity in enumerate(entity_list):
+        state = 0
+        for char in entity.lower():
+            if char not in goto[state]:
+                goto.append({})
+                fail.append(0)
+                matches.append([])
+                goto[state][char] = len(goto) - 1
+            state = goto[state][char]
+        #(LENGTH, POSITION IN THE LIST, ENTITY) OF EVERY NAME ENDING IN THE STATE
+        matches[state].append((len(entity.lower()), position, entity))
+    #BREADTH FIRST, SO THE FALLBACK OF A STATE (ITS LONGEST PROPER SUFFIX IN THE AUTOMATON) IS FINISHED BEFORE THE STATE
+    queue = list(goto[0].values())
+    for state in queue:
+        for char, child in goto[state].items():
+            fallback = fail[state]
+            while fallback and char not in goto[fallback]:
+                fallback = fail[fallback]
+            fail[child] = goto[fallback].get(char, 0)
+            matches[child] = matches[child] + matches[fail[child]]
+            queue.append(child)
+    return {'goto': goto, 'fail': fail, 'matches': matches}
+
+def find_entity_in_question(question, matcher):
+    """Finds the longest known entity (destination or country) standing as whole words in the user's question."""
+    goto, fail, matches = matcher['goto'], matcher['fail'], matcher['matches']
+    question_lower = question.lower()
+    best, state = None, 0
+    for end, char in enumerate(question_lower):
+        while state and char not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(char, 0)
+        if end + 1 < len(question_lower) and question_lower[end + 1].isalnum():
+            continue
+        for length, position, entity in matches[state]:
+            start = end + 1 - length
+            if (start == 0 or not question_lower[start - 1].isalnum()) and (best is None or (-length, position) < best[:2]):
+                best = (-length, position, entity)
+    return best[2] if best else None
+
+def _entity_matchers(dest_data, all_destinations, all_countries):
+    sizes = (len(all_destinations), len(all_countries))
+    if _ENTITY_MATCHERS.get('data') is not dest_data or _ENTITY_MATCHERS['sizes'] != sizes:
+        _ENTITY_MATCHERS.update(data=dest_data, sizes=sizes, destinations=build_entity_matcher([d.split(' - ')[-1] for d in all_destinations]),
+                                countries=build_entity_matcher(all_countries))
+    return _ENTITY_MATCHERS['destinations'], _ENTITY_MATCHERS['countries']
+
+def classify_question(question_lower, router=KEYWORD_ROUTER):
+    """Set of the intent keywords found in a lowercased question."""
+    keywords = set()
+    for match in router['plain'].finditer(question_lower):
+        keywords |= router['implied'][match.group(1)]
+    for match in router['patterns'].finditer(question_lower):
+        keywords.update(keyword for keyword, pattern in router['pattern_keywords'].items() if pattern.match(question_lower, match.start()))
+    return keywords
+
+def get_chatbot_response(question, dest_data, attr_data, all_destinations, all_countries, all_months):
+    """The main chatbot logic function."""
+    question_lower = question.lower().strip()
+    destination_matcher, country_matcher = _entity_matchers(dest_data, all_destinations, all_countries)
+    destination = find_entity_in_question(question, destination_matcher)
+    country = find_entity_in_question(question, country_matcher) if not destination else None
+    
+    keywords = classify_question(question_lower)
+
+    #NEARBY DESTINATIONS ("near Rome", "within 300 km of Rome")
+    radius = RADIUS_PATTERN.search(question_lower) if 'within' in keywords else None
+    if destination and (radius or 'near' in keywords) and 'Latitude' in dest_data.columns:
+        nearby = nearby_destinations(dest_data, destination, float(radius.group(1)) if radius else None)
+        if nearby is None:
+            return f"Sorry, I don't know where **{destination}** is."
+        if not nearby:
+            return (f"There are no other destinations within {radius.group(1)} km of **{destination}**." if radius
+                    else f"There are no other destinations near **{destination}**.")
+        lines = [f"- **{name}** ({nearby_country}): {km:.0f} km" for name, nearby_country, km in nearby]
+        title = f"Destinations within {radius.group(1)} km of **{destination}**" if radius else f"Destinations nearest to **{destination}**"
+        return title + " (straight-line distance):\n" + "\n".join(lines)
+
+    if keywords.intersection(GREETINGS):
+        return """
+    ### Welcome to the Personal Travel Recommender!
+
+    Here's a quick guide on how to use the application:
+
+    **1. Choose Your Goal in the Sidebar**
+    * **Vacation:** For planning short-term trips. This mode focuses on factors like budget, attractions, and weather for a specific month.
+    * **Emigration:** For evaluating long-term living prospects. This mode uses year-round climate data and focuses on socio-economic factors like cost of living, safety, and purchasing power.
+
+    **2. Define Your Preferences**
+    * Use the widgets in the sidebar to tell the model what you're looking for. The options will change depending on the goal you've selected.
+
+    **3. Fine-Tune the Model (Optional)**
+    * In the "Adjust Model Weights" section, you can load a preset "persona" (like 'Budget Explorer' or 'The Family') to automatically set the importance of each factor. You can then fine-tune any of the sliders yourself.
+
+    **4. Get Recommendations**
+    * Once you're ready, click the "Find..." button to generate your personalized list of the top 10 destinations.
+
+    **5. Ask Me Anything!**
+    * You can also use me, the chatbot, to ask specific questions like "What is the safety in Berlin?", "Tell me about Rome", or "Show me flights to Paris".
+
+    **Ready to start? Select your goal in the sidebar!**
+    """
+
+
+    #Help command
+    if 'help' in keywords:
+        return """
+        I can help you with a few things. Try asking:
+        - **Find data**: "What is the HDI for Germany?" or "Weather in Rome in May?". I can find data for any metric used in the model.
+        - **Explain concepts**: "How do weights work?", "How does the model work?", or "What is HDI?".
+        - **Find top attractions**: "What is the most popular attraction in London?".
+        - **Get a summary**: "Tell me about Warsaw".
+        - **Find deals & info**: "Show me flights to Paris" or "Find hotels in Barcelona".
+        - **Find nearby places**: "Destinations near Rome" or "What is within 300 km of Vienna?".
+        """
+    
+    # First, check for an entity (destination or country)
+    entity = destination if destination else country
+    if entity:
+        if destination: entity_data = dest_data[dest_data['Destination'] == entity]
+        else: entity_data = dest_data[dest_data['Country'] == entity]
+        if entity_data.empty: return f"Sorry, I couldn't find any data for {entity}."
+
+        # Most popular attraction
+        if 'most popular' in keywords and 'attraction' in keywords:
+            if destination and not attr_data.empty:
+                top_attraction = attr_data[attr_data['Destination'] == destination].sort_values(by='No_votes', ascending=False).iloc[0]
+                name = top_attraction['Name']
+                url = f"https://www.google.com/search?q={name.replace(' ', '+')}"
+                return f"The most popular attraction in **{destination}** (based on number of votes) is **{name}**.\n\n[Search for more info here]({url})"
+            else:
+                return "Sorry, I can only find the most popular attraction for a specific destination, not an entire country."
+        
+        # Tell me about
+        if 'tell me about' in keywords:
+            data_row = entity_data.iloc[0]
+            info = f"### Summary for **{entity}**:\n"
+            info += f"- **Safety Index:** {data_row.get('Safety_Index', 'N/A')!s}\n"
+            info += f"- **Cost of Living + Rent Index:** {data_row.get('CostofLivingPlusRentIndex', 'N/A')!s}\n"
+            info += f"- **Purchasing Power Index:** {data_row.get('LocalPurchasingPowerIndex', 'N/A')!s}\n"
+            info += f"- **Cuisine Rank:** {data_row.get('Cuisine_Rank', 'N/A')!s}\n"
+            url = f"https://en.wikipedia.org/wiki/{entity.replace(' ', '_')}"
+            info += f"\n[Read more on Wikipedia]({url})"
+            return info
+
+        # Data lookup from the database
+        for keyword, (col, fmt) in DATA_KEYWORDS.items():
+            if keyword in keywords and col in entity_data.columns:
+                value = pd.to_numeric(entity_data[col], errors='coerce').mean()
+                return f"The average {keyword.replace('_', ' ')} for **{entity}** is: **{value:{fmt}}**."
+        if 'weather' in keywords:
+            for month in all_months:
+                if month.lower() in question_lower:
+                    month_abbr = month[:3].capitalize()
+                    if month_abbr in entity_data.columns:
+                        weather = entity_data[month_abbr].iloc[0]
+                        return f"The weather in **{entity}** in {month} is typically **{weather}**."
+            return "Please specify a month to get the weather forecast (e.g., 'weather in Paris in July')."
+        
+        # Link generation
+
+        if 'flight' in keywords:
+            url = f"https://www.google.com/flights?q=flights+from+Poland+to+{entity.replace(' ', '+')}"
+            return f"Sure, here is a link to search for flights to {entity}:\n[Click here for flights]({url})"
+        if 'hotel' in keywords:
+            url = f"https://www.booking.com/searchresults.html?ss={entity.replace(' ', '+')}"
+            return f"Of course, here is a link to search for hotels in {entity}:\n[Click here for hotels]({url})"
+        if 'wikipedia' in keywords or 'information' in keywords:
+            url = f"https://en.wikipedia.org/wiki/{entity.replace(' ', '_')}"
+            return f"Here is the Wikipedia page for {entity}:\n[Read more on Wikipedia]({url})"
+            
+    # Rule 3: Explanations (checked only if no entity was found)
+    for keyword, answer in EXPLANATIONS.items():
+        if keyword in keywords:
+            return answer
+ 
+    #Default response
+    return "Sorry, I don't understand that question. Try asking 'help' to see what I can do."
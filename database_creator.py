@@ -1,6 +1,8 @@
 import pandas as pd
 import sqlite3
 import re
+from recommender import build_destination_aggregates, compact_snapshot_tables, create_destination_indexes, get_database_version
+from snapshot import snapshot_path, write_snapshot
 
 print("DATA PROCESSING - START")
 
@@ -139,6 +141,8 @@ print("Preparing final tables...")
 df_main_destinations = pd.merge(df_dest_countries, df_country_stats, on='Country', how='left')
 df_main_destinations = pd.merge(df_main_destinations, df_dest_stats, on=['Destination', 'Country'], how='left')
 df_main_destinations = pd.merge(df_main_destinations, popularity_counts, on='Destination', how='left')
+#INTEGER KEY OF EVERY DESTINATION
+df_main_destinations.insert(0, 'Destination_ID', range(len(df_main_destinations)))
 
 #CREATING SQL FROM CSV
 def make_sql_safe_col_names(df_to_clean):
@@ -148,15 +152,29 @@ def make_sql_safe_col_names(df_to_clean):
 
 df_main_destinations = make_sql_safe_col_names(df_main_destinations)
 df_attractions_processed_safe = make_sql_safe_col_names(df_attractions_processed.copy())
+#PER DESTINATION SUMS OF THE ATTRACTIONS, SO THE RECOMMENDER DOES NOT HAVE TO GROUP THE WHOLE ATTRACTIONS TABLE
+print("Aggregating attractions per destination...")
+df_destination_aggregates, df_destination_group_masks = build_destination_aggregates(df_main_destinations, df_attractions_processed_safe)
 #SAVING TO DATABASE AND CSV
 try:
     print(f"Saving data to database: {db_name}...")
     conn = sqlite3.connect(db_name)
     df_main_destinations.to_sql('destinations', conn, if_exists='replace', index=False)
     df_attractions_processed_safe.to_sql('attractions', conn, if_exists='replace', index=False)
+    df_destination_aggregates.to_sql('destination_aggregates', conn, if_exists='replace', index=False)
+    df_destination_group_masks.to_sql('destination_group_masks', conn, if_exists='replace', index=False)
+    #STREAMING READS THESE TABLES IN RANGES OF Destination_ID
+    create_destination_indexes(conn)
     conn.commit()
     conn.close()
     print("Saving to database successful.")
+    #SNAPSHOT IS TAKEN FROM THE SAVED TABLES SO BOTH SOURCES RETURN THE SAME TYPES
+    print(f"Saving columnar snapshot: {snapshot_path(db_name)}...")
+    conn = sqlite3.connect(db_name)
+    snapshot_tables = {table: pd.read_sql_query(f"SELECT * FROM {table}", conn)
+                       for table in ['destinations', 'attractions', 'destination_aggregates', 'destination_group_masks']}
+    conn.close()
+    write_snapshot(compact_snapshot_tables(snapshot_tables), snapshot_path(db_name), get_database_version(db_name))
     #WE WILL HAVE TWO FILES, DESTINATIONS AND ATTRACTIONS
     output_dest_csv = "final_destinations.csv"
     output_attr_csv = "final_attractions.csv"
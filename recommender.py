@@ -1,8 +1,25 @@
 import pandas as pd
+import numpy as np
 import sqlite3
+import os
 import re
+import json
+import heapq
+import hashlib
+import threading
+import time
+import tracemalloc
+import mmap
+import sys
+import csv
+import argparse
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from snapshot import snapshot_path, read_manifest, read_snapshot_table
 
 
+DB_NAME = "travel_recommendation_final.db"
 
 
 #SCALE FOR WEATHER PREFERENCE  
@@ -14,6 +31,52 @@ ALL_ATTRACTION_GROUPS = [
     'Scenic_Transport', 'Science_Technology', 'Beach', 'Mountains_and_trails',
     'Landmark', 'Top_200_Popular'
 ]
+MONTH_COLUMNS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+#FACTORS IN THE ORDER THEY ARE ADDED TO THE SCORE
+VACATION_FACTORS = ['weather', 'budget', 'attractions_quantity', 'attractions_quality', 'distance', 'safety',
+                    'attractions_popularity', 'english_level', 'known_languages', 'cuisine_quality']
+EMIGRATION_FACTORS = ['weather', 'distance', 'cost_of_living', 'unemployment', 'inflation', 'purchasing_power',
+                      'safety', 'hdi', 'life_expectancy', 'english_level', 'known_languages']
+
+#FACTORS WHICH DO NOT DEPEND ON USER PREFERENCES: (DATABASE COLUMN, NORMALISATION)
+#'higher' - THE HIGHER THE BETTER, 'lower' - THE LOWER THE BETTER, 'closer' - SQUARED FALLOFF WITH DISTANCE, 'none' - ALREADY A 0-1 SCORE
+STATIC_FACTORS = {
+    'budget': ('Overall_Daily_Cost_MidRange_USD', 'lower'),
+    'distance': ('Distance_from_Lodz_km_road', 'closer'),
+    'safety': ('Safety_Index', 'higher'),
+    'attractions_popularity': ('Popularity_Score_Sum', 'higher'),
+    'english_level': ('English_EPI_Score', 'higher'),
+    'cuisine_quality': ('Cuisine_Rank', 'none'),
+    'cost_of_living': ('CostofLivingPlusRentIndex', 'lower'),
+    'unemployment': ('Unemployment_Rate_National_Latest_Pct', 'lower'),
+    'inflation': ('Inflation_Rate_National_Latest_Pct', 'lower'),
+    'purchasing_power': ('LocalPurchasingPowerIndex', 'higher'),
+    'hdi': ('HDI_Value_Latest', 'higher'),
+    'life_expectancy': ('Life_Expectancy', 'higher'),
+}
+#BUDGET AND DISTANCE ARE SCORED BEFORE MISSING VALUES ARE REPLACED WITH 0, SO THEIR GAPS DO NOT TAKE PART IN NORMALISATION
+UNFILLED_FACTORS = ['budget', 'distance']
+#SCORE GIVEN WHEN ALL CANDIDATES HAVE THE SAME VALUE (OTHERWISE THE FACTOR GIVES NO POINTS)
+CONSTANT_FACTOR_SCORE = {'distance': 0.5, 'english_level': 0.5}
+#POPULARITY CAN HAVE A NEGATIVE WEIGHT (HIDDEN GEMS), OTHER FACTORS ONLY COUNT WHEN THEIR WEIGHT IS POSITIVE
+SIGNED_FACTORS = ['attractions_popularity']
+
+#PRESET WEIGHTS (PERSONAS OFFERED BY THE APP)
+VACATION_PRESETS = {
+    "Balanced": { 'weather': 0.3, 'budget': 0.3, 'attractions_quantity': 0.3, 'attractions_quality': 0.30, 'safety': 0.20, 'attractions_popularity': 0.10, 'english_level': 0.25, 'known_languages': 0.20, 'distance': 0.05, 'cuisine_quality': 0.15 },
+    "Budget Explorer": { 'weather': 0.3, 'budget': 0.6, 'attractions_quantity': 0.3, 'attractions_quality': 0.1, 'safety': 0.1, 'attractions_popularity': 0.05, 'english_level': 0.2, 'known_languages': 0.3, 'distance': 0.15, 'cuisine_quality': 0.20 },
+    "Culture & Cuisine Connoisseur": { 'weather': 0.1, 'budget': 0.0, 'attractions_quantity': 0.2, 'attractions_quality': 0.5, 'safety': 0.20, 'attractions_popularity': 0.1, 'english_level': 0.2, 'known_languages': 0.3, 'distance': 0.0, 'cuisine_quality': 0.6 },
+    "Off-Grid Adventurer": { 'weather': 0.3, 'budget': 0.2, 'attractions_quantity': 0.3, 'attractions_quality': 0.1, 'safety': 0.1, 'attractions_popularity': -0.5, 'english_level': 0.2, 'known_languages': 0.0, 'distance': 0.0, 'cuisine_quality': 0.1},
+    "Family Vacation": { 'weather': 0.5, 'budget': 0.25, 'attractions_quantity': 0.5, 'attractions_quality': 0.4, 'safety': 0.3, 'attractions_popularity': 0.4, 'english_level': 0.05, 'known_languages': 0.05, 'distance': 0.2, 'cuisine_quality': 0.3 }
+}
+EMIGRATION_PRESETS = {
+    "Balanced": { 'cost_of_living': 0.20, 'purchasing_power': 0.20, 'safety': 0.10, 'english_level': 0.10, 'hdi': 0.10, 'unemployment': 0.10, 'inflation': 0.05, 'life_expectancy': 0.05, 'distance': 0.05, 'weather': 0.05, 'known_languages': 0.05 },
+    "Young Professional": { 'cost_of_living': 0.15, 'purchasing_power': 0.5, 'safety': 0.05, 'english_level': 0.3, 'hdi': 0.05, 'unemployment': 0.2, 'inflation': 0.1, 'life_expectancy': 0.0, 'distance': 0.0, 'weather': 0.0, 'known_languages': 0.4 },
+    "The Family": { 'cost_of_living': 0.3, 'purchasing_power': 0.1, 'safety': 0.3, 'english_level': 0.05, 'hdi': 0.2, 'unemployment': 0.2, 'inflation': 0.2, 'life_expectancy': 0.2, 'distance': 0.1, 'weather': 0.1, 'known_languages': 0.0 },
+    "Digital Nomad": { 'cost_of_living': 0.5, 'purchasing_power': 0.0, 'safety': 0.2, 'english_level': 0.3, 'hdi': 0.0, 'unemployment': 0.0, 'inflation': 0.1, 'life_expectancy': 0.0, 'distance': 0.0, 'weather': 0.3, 'known_languages': 0.0 },
+    "Retiree": { 'cost_of_living': 0.4, 'purchasing_power': 0.1, 'safety': 0.3, 'english_level': 0.05, 'hdi': 0.3, 'unemployment': 0.0, 'inflation': 0.1, 'life_expectancy': 0.4, 'distance': 0.0, 'weather': 0.4, 'known_languages': 0.0 }
+}
 
 #POPULARITY SCORE FUNCTION
 def calculate_attraction_popularity_score(rank, max_rank):
@@ -39,235 +102,1514 @@ def calculate_cuisine_score(rank, max_rank=100):
     score = (1 - ((rank - 1) / (max_rank - 1))) ** 2
     return score
 
+#WEATHER SCORE
+def score_weather(current_weather, preferred_weather):
+    """Compares the weather in a destination with the preferred one on WEATHER_SCALE."""
+    max_allowed_distance = 3
+    weather_value = str(current_weather).strip().lower()
+    try:
+        user_index = WEATHER_SCALE.index(preferred_weather.lower())
+        current_index = WEATHER_SCALE.index(weather_value)
+        distance = abs(user_index - current_index)
+        if distance > max_allowed_distance: return 0.0
+        else: return 1.0 - (distance / max_allowed_distance)
+    except ValueError: return 0.0
 
-#VACATION RECOMMENDATION
-def get_vacation_recommendations(preferences, weights, top_n=10):
-    #CONNECTING TO TRAVEL_RECOMMENDATION DATABASE
+#WEATHER IS STORED AS A POSITION ON WEATHER_SCALE, UNKNOWN VALUES GET THE CODE RIGHT AFTER THE SCALE
+UNKNOWN_WEATHER = len(WEATHER_SCALE)
+#POINTS FOR EVERY (PREFERRED, OBSERVED) PAIR OF CODES, THE LAST COLUMN (UNKNOWN WEATHER) GIVES NO POINTS
+WEATHER_MATCH_TABLE = np.array([[score_weather(observed, preferred) for observed in WEATHER_SCALE + ['']] for preferred in WEATHER_SCALE])
+
+def encode_weather(values):
+    """Converts weather descriptions to integer codes on WEATHER_SCALE."""
+    codes = pd.Categorical(pd.Series(values, dtype=object).astype(str).str.strip().str.lower(), categories=WEATHER_SCALE).codes
+    return np.where(codes < 0, UNKNOWN_WEATHER, codes).astype(np.int8)
+
+def weather_points(preferred_weather, codes):
+    """Points for an array of weather codes (any shape), all zeros if the preference is not on the scale."""
+    preferred = str(preferred_weather).lower()
+    if preferred not in WEATHER_SCALE:
+        return np.zeros(codes.shape)
+    return WEATHER_MATCH_TABLE[WEATHER_SCALE.index(preferred)][codes]
+
+
+#ATTRACTION GROUPS AS BITS (BIT I = ALL_ATTRACTION_GROUPS[I])
+GROUP_BITS = 1 << np.arange(len(ALL_ATTRACTION_GROUPS))
+#QUALITY TABLE HAS A ROW FOR EVERY COMBINATION OF GROUPS, IT IS ONLY BUILT WHILE IT STAYS REASONABLY SMALL (ABOUT 8M CELLS)
+QUALITY_TABLE_MAX_CELLS = 1 << 23
+
+def group_mask(groups):
+    """Bitmask of a list of attraction groups."""
+    mask = 0
+    for group in groups:
+        mask |= 1 << ALL_ATTRACTION_GROUPS.index(group)
+    return mask
+
+def build_quality_table(dest_rows, group_masks, rating_x_votes, no_votes, counts, n):
+    """Vote-weighted rating sums, vote sums and match flags of every destination for every combination of groups.
+
+    Row S of each table covers the attractions which have at least one of the groups in S. It is computed with a
+    sum over subsets: after the transform row T holds the attractions whose groups all lie inside T, and the
+    attractions matching S are all attractions minus the ones lying inside the complement of S.
+    """
+    size = 1 << len(ALL_ATTRACTION_GROUPS)
+    full = size - 1
+    tables = {}
+    for name, values in [('rating_x_votes', rating_x_votes), ('no_votes', no_votes), ('matches', counts)]:
+        table = np.zeros((size, n))
+        np.add.at(table, (group_masks, dest_rows), values)
+        for bit in range(len(ALL_ATTRACTION_GROUPS)):
+            view = table.reshape(-1, 2, 1 << bit, n)
+            view[:, 1] += view[:, 0]
+        tables[name] = table[full] - table[full ^ np.arange(size)]
+    tables['matches'] = tables['matches'] > 0
+    return tables
+
+
+#PER DESTINATION AGGREGATES OF THE ATTRACTIONS TABLE (MATERIALISED BY database_creator.py)
+AGGREGATE_SUMS = ['Attraction_Count', 'No_votes_Sum', 'Rating_x_votes_Sum']
+
+def attraction_popularity_points(no_votes):
+    """calculate_attraction_popularity_score of every attraction, vectorised (rank among all attractions in the database)."""
+    #ASSIGINNG POINTS FOR POPULARITY
+    rank = pd.Series(no_votes).rank(method='max', ascending=False).to_numpy()
+    max_rank = np.nanmax(rank) if rank.size else np.nan
+    points = np.select([rank == 1, rank <= 5, rank <= 20, rank <= 50, rank <= 100, rank <= 200, rank <= 500, rank <= 1000, rank <= max_rank / 2],
+                       [1.0, 0.9, 0.8, 0.7, 0.6, 0.5, 0.3, 0.2, 0.1], 0.05)
+    return pd.Series(np.where(np.isnan(rank), 0.0, points), index=getattr(no_votes, 'index', None))
+
+def build_destination_aggregates(df_dest, df_attr, popularity_points=None):
+    """Numeric per destination sums of the attractions, keyed by Destination_ID.
+
+    Returns the destination aggregates (group counts, popularity points, votes) and the same sums split by the
+    group mask of the attractions, which is all that attraction quality needs. Popularity points can be passed in when
+    df_attr is only a part of the attractions, since they depend on the rank among all of them.
+    """
+    dest_ids = df_dest['Destination_ID'] if 'Destination_ID' in df_dest.columns else pd.Series(np.arange(len(df_dest)))
+    attr = pd.DataFrame({
+        'Destination_ID': df_attr['Destination'].map(pd.Series(dest_ids.to_numpy(), index=df_dest['Destination'])),
+        'Group_Mask': (df_attr[ALL_ATTRACTION_GROUPS].to_numpy() > 0) @ GROUP_BITS,
+        'Attraction_Count': 1,
+        'No_votes_Sum': df_attr['No_votes'],
+        'Rating_x_votes_Sum': df_attr['Avg_rating'] * df_attr['No_votes'],
+        'Popularity_Score_Sum': attraction_popularity_points(df_attr['No_votes']) if popularity_points is None else popularity_points,
+    })
+    attr = attr.join(df_attr[ALL_ATTRACTION_GROUPS]).dropna(subset=['Destination_ID'])
+    attr['Destination_ID'] = attr['Destination_ID'].astype(np.int64)
+    #DESTINATIONS WITHOUT ATTRACTIONS GET 0
+    aggregates = (attr.groupby('Destination_ID')[AGGREGATE_SUMS + ['Popularity_Score_Sum'] + ALL_ATTRACTION_GROUPS].sum()
+                  .reindex(pd.Index(dest_ids.to_numpy(), name='Destination_ID'), fill_value=0).reset_index())
+    group_masks = attr.groupby(['Destination_ID', 'Group_Mask'])[AGGREGATE_SUMS].sum().reset_index()
+    return aggregates, group_masks
+
+
+#FEATURE STORE
+#THE DATABASE IS LOADED ONLY ONCE PER VERSION OF THE FILE, EVERYTHING THAT DOES NOT DEPEND ON THE USER IS PRECOMPUTED
+#ONLY THE COLUMNS OF FACTORS WHICH WERE ACTUALLY USED ARE READ, SO A REQUEST WITH A FEW WEIGHTS LOADS A FEW COLUMNS
+#DATABASE COLUMNS READ BY EVERY FACTOR, AS {TABLE: COLUMNS} (AGGREGATES TABLES ARE ALSO READ WITH Destination_ID)
+FACTOR_COLUMNS = {
+    **{factor: {'destinations': [col]} for factor, (col, _) in STATIC_FACTORS.items()},
+    'attractions_popularity': {'destination_aggregates': ['Popularity_Score_Sum']},
+    'weather': {'destinations': MONTH_COLUMNS},
+    'known_languages': {'destinations': ['Language']},
+    'attractions_quantity': {'destination_aggregates': ALL_ATTRACTION_GROUPS},
+    'attractions_quality': {'destination_group_masks': ['Group_Mask'] + AGGREGATE_SUMS},
+    #COORDINATES ARE ONLY READ WHEN THE USER GIVES A TRIP ORIGIN
+    'origin': {'destinations': ['Latitude', 'Longitude']},
+}
+#COLUMNS OF THE ATTRACTIONS WHICH THE AGGREGATES ARE BUILT FROM WHEN THE DATABASE DOES NOT HAVE THEM
+AGGREGATE_SOURCE_COLUMNS = ['Destination', 'No_votes', 'Avg_rating'] + ALL_ATTRACTION_GROUPS
+#COLUMNS NEEDED BY EVERY MODE TO NAME AND EXCLUDE DESTINATIONS
+BASE_COLUMNS = ['Destination_ID', 'Destination', 'Country']
+_FEATURE_STORES = {}
+_CONTENT_VERSIONS = {}
+
+def get_database_version(db_path=DB_NAME):
+    """Hash of the database content, only recomputed when the size or modification time of the file changes."""
+    stat = os.stat(db_path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _CONTENT_VERSIONS.get(db_path)
+    if cached is None or cached[0] != stamp:
+        digest = hashlib.sha1()
+        with open(db_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        cached = (stamp, digest.hexdigest())
+        _CONTENT_VERSIONS[db_path] = cached
+    return cached[1]
+
+def read_table(table, db_path=DB_NAME, columns=None):
+    """Reads a table from the memory-mapped snapshot when it matches the database, otherwise from SQLite."""
+    version = get_database_version(db_path)
+    manifest = read_manifest(snapshot_path(db_path))
+    if manifest and manifest['version'] == version and table in manifest['tables']:
+        return read_snapshot_table(snapshot_path(db_path), table, columns, manifest)
+    conn = sqlite3.connect(db_path)
     try:
-        conn = sqlite3.connect("travel_recommendation_final.db")
-        df_dest = pd.read_sql_query("SELECT * FROM destinations", conn)
-        df_attr = pd.read_sql_query("SELECT * FROM attractions", conn)
+        selected = '*' if columns is None else ', '.join(f'"{col}"' for col in columns)
+        return pd.read_sql_query(f"SELECT {selected} FROM {table}", conn)
+    finally:
         conn.close()
-    except Exception as e:
-        print(f"Error loading data from database: {e}")
+
+#COMPACT TYPES OF THE TABLES KEPT IN MEMORY BY THE APP (TEXT REPEATED ACROSS ROWS IS CATEGORICAL, FLAGS ARE INT8),
+#OTHER FLOAT COLUMNS BECOME FLOAT32 AND OTHER INTEGER COLUMNS GET THE SMALLEST TYPE WHICH HOLDS THEIR VALUES
+COMPACT_SCHEMA = {
+    'destinations': {col: 'category' for col in ['Destination', 'Country', 'Language'] + MONTH_COLUMNS},
+    'attractions': {'Destination': 'category', 'Country': 'category', 'Name': 'object', **{group: 'int8' for group in ALL_ATTRACTION_GROUPS}},
+}
+
+def apply_compact_schema(df, table):
+    """Copy of a table converted to the compact types of COMPACT_SCHEMA.
+
+    A table opened from the snapshot is returned as it is: it was written with these types (compact_snapshot_tables) and its
+    numbers and categorical codes are views of the read-only memory maps, which every process shares (copies would be private).
+    """
+    if df.attrs.get('memory_mapped'):
+        return df
+    schema = COMPACT_SCHEMA.get(table, {})
+    dtypes = {}
+    for col in df.columns:
+        if col in schema:
+            dtypes[col] = schema[col]
+        elif pd.api.types.is_float_dtype(df[col]):
+            dtypes[col] = 'float32'
+        elif pd.api.types.is_integer_dtype(df[col]):
+            dtypes[col] = pd.to_numeric(df[col], downcast='integer').dtype
+    return df.astype(dtypes)
+
+def compact_snapshot_tables(tables):
+    """Tables to write to the snapshot, the ones in COMPACT_SCHEMA with its compact types.
+
+    Float columns which the factors (or the aggregates rebuilt from the attractions) read stay float64, so the feature store
+    keeps them as views of the memory maps and scores exactly as from SQLite.
+    """
+    exact = required_columns(list(FACTOR_COLUMNS))
+    exact['attractions'] = AGGREGATE_SOURCE_COLUMNS
+    compact = {}
+    for table, df in tables.items():
+        if table not in COMPACT_SCHEMA:
+            compact[table] = df
+            continue
+        compact[table] = apply_compact_schema(df, table)
+        for col in exact.get(table, []):
+            if col in df.columns and pd.api.types.is_float_dtype(df[col]):
+                compact[table][col] = df[col]
+    return compact
+
+def is_memory_mapped(values):
+    """True if the array is a view of a memory-mapped file."""
+    base = values
+    while base is not None:
+        if isinstance(base, mmap.mmap):
+            return True
+        base = getattr(base, 'base', None)
+    return False
+
+def memory_report(frames):
+    """Rows, columns, memory (deep, in bytes) of a dict of {name: DataFrame} and the part of it in memory maps,
+    which processes share, while the rest is private to every process.
+    """
+    report = []
+    for name, df in frames.items():
+        #ONLY THE CODES OF A CATEGORICAL CAN BE MAPPED, ITS CATEGORIES ARE ALWAYS PRIVATE
+        arrays = [df[col].array.codes if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col].to_numpy() for col in df.columns]
+        mapped = sum(values.nbytes for values in arrays if is_memory_mapped(values))
+        total = int(df.memory_usage(deep=True).sum())
+        report.append({'table': name, 'rows': len(df), 'columns': df.shape[1], 'bytes': total, 'mapped_bytes': mapped,
+                       'private_bytes': total - mapped})
+    return pd.DataFrame(report)
+
+def table_columns(table, db_path=DB_NAME):
+    """Names of the columns of a table, without loading any rows."""
+    manifest = read_manifest(snapshot_path(db_path))
+    if manifest and manifest['version'] == get_database_version(db_path) and table in manifest['tables']:
+        return list(manifest['tables'][table]['columns'])
+    conn = sqlite3.connect(db_path)
+    try:
+        return list(pd.read_sql_query(f"SELECT * FROM {table} LIMIT 0", conn).columns)
+    finally:
+        conn.close()
+
+def required_columns(factors):
+    """Union of the database columns read by the given factors, as {table: columns}."""
+    columns = {}
+    for factor in factors:
+        for table, cols in FACTOR_COLUMNS[factor].items():
+            columns.setdefault(table, [])
+            columns[table] += [col for col in cols if col not in columns[table]]
+    return columns
+
+def _inverted_list(names):
+    """(lowercased name -> id, rows sorted by id, start of every id in them): the rows of id i are rows[starts[i]:starts[i + 1]]."""
+    ids, unique_names = pd.factorize(names.str.lower())
+    starts = np.concatenate([[0], np.cumsum(np.bincount(ids, minlength=len(unique_names)))])
+    return dict(zip(unique_names, range(len(unique_names)))), np.argsort(ids, kind='stable'), starts
+
+def _base_store(df_dest, db_path):
+    """Store with the names of the given destinations and no factors yet."""
+    n = len(df_dest)
+    return {
+        'db_path': db_path,
+        'dest_ids': pd.Index(df_dest['Destination_ID'] if 'Destination_ID' in df_dest.columns else np.arange(n)),
+        'names': df_dest[['Destination', 'Country']].astype(str),
+        'name_rank': np.argsort(np.argsort(df_dest['Destination'].to_numpy(), kind='stable'), kind='stable'),
+        #LOWERCASED NAME -> ID AND THE ROWS OF EVERY ID, SO EXCLUSIONS AND ORIGINS ARE LOOKED UP WITHOUT SCANNING THE NAMES
+        'name_ids': {col: _inverted_list(df_dest[col].astype(str)) for col in ['Country', 'Destination']},
+        #RAW VALUES AND NORMALISED SCORES OVER THE WHOLE CATALOGUE (USED WHEN THE USER DOES NOT EXCLUDE ANYTHING) OF STATIC FACTORS
+        'raw': {},
+        'factors': {},
+        'loaded': set(),
+        'lock': threading.Lock(),
+    }
+
+def build_feature_store(db_path=DB_NAME):
+    """Loads the names of the destinations, the factor columns are added by load_factors when they are first needed."""
+    return _base_store(read_table('destinations', db_path, [col for col in BASE_COLUMNS if col in table_columns('destinations', db_path)]), db_path)
+
+def _read_aggregates(store, table, columns):
+    """Projected aggregates table, computed from the attractions if the database does not have it yet."""
+    db_path = store['db_path']
+    try:
+        return read_table(table, db_path, ['Destination_ID'] + columns)
+    except pd.errors.DatabaseError:
+        #DATABASE CREATED BEFORE THE AGGREGATES WERE MATERIALISED
+        df_dest = read_table('destinations', db_path, [col for col in ['Destination_ID', 'Destination'] if col in table_columns('destinations', db_path)])
+        df_attr = read_table('attractions', db_path, AGGREGATE_SOURCE_COLUMNS)
+        aggregates, group_masks = build_destination_aggregates(df_dest, df_attr)
+        return aggregates if table == 'destination_aggregates' else group_masks
+
+def _align_aggregates(store, table, frame):
+    """Aggregates in the row order of the store: one row per destination, or the group masks with their destination row."""
+    if table == 'destination_aggregates':
+        return frame.set_index('Destination_ID').reindex(store['dest_ids'], fill_value=0).reset_index(drop=True)
+    frame['dest_row'] = store['dest_ids'].get_indexer(frame['Destination_ID'])
+    return frame[frame['dest_row'] >= 0].reset_index(drop=True)
+
+def _prepare_factors(store, factors, tables, catalogue_size):
+    """Precomputes the factors from their tables (the quality table is only built if the whole catalogue would fit in it)."""
+    n = len(store['names'])
+    for factor in factors:
+        if factor in STATIC_FACTORS:
+            col = STATIC_FACTORS[factor][0]
+            source = tables['destination_aggregates' if factor == 'attractions_popularity' else 'destinations'][col]
+            if factor == 'cuisine_quality':
+                source = source.fillna(0).apply(calculate_cuisine_score)
+            #A FLOAT COLUMN OF THE SNAPSHOT STAYS A VIEW OF ITS MEMORY MAP UNLESS MISSING VALUES HAVE TO BE FILLED
+            values = (source if pd.api.types.is_float_dtype(source) else pd.to_numeric(source, errors='coerce')).to_numpy(dtype=float)
+            fill = factor not in UNFILLED_FACTORS and np.isnan(values).any()
+            store['raw'][factor] = np.where(np.isnan(values), 0.0, values) if fill else values
+            store['factors'][factor] = normalize_factor(store['raw'][factor], factor, *value_range(store['raw'][factor]))
+        elif factor == 'weather':
+            store['weather_codes'] = np.column_stack([encode_weather(tables['destinations'][month_col]) for month_col in MONTH_COLUMNS])
+        elif factor == 'known_languages':
+            store['language_lower'] = tables['destinations']['Language'].astype(object).fillna(0).astype(str).str.lower().to_numpy()
+        elif factor == 'origin':
+            store['coordinates'] = tables['destinations'][['Latitude', 'Longitude']].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+            store['spatial_index'] = build_spatial_index(store['coordinates'][:, 0], store['coordinates'][:, 1])
+            store['origin_distances'] = OrderedDict()
+        elif factor == 'attractions_quantity':
+            store['group_counts'] = tables['destination_aggregates'][ALL_ATTRACTION_GROUPS].astype(float)
+        elif factor == 'attractions_quality':
+            group_masks = tables['destination_group_masks']
+            store['group_masks'] = group_masks
+            if catalogue_size << len(ALL_ATTRACTION_GROUPS) <= QUALITY_TABLE_MAX_CELLS:
+                store['quality_table'] = build_quality_table(group_masks['dest_row'].to_numpy(), group_masks['Group_Mask'].to_numpy(),
+                                                             group_masks['Rating_x_votes_Sum'].to_numpy(), group_masks['No_votes_Sum'].to_numpy(),
+                                                             group_masks['Attraction_Count'].to_numpy(), n)
+        store['loaded'].add(factor)
+
+def load_factors(store, factors):
+    """Reads the columns of the factors which are not in the store yet (one projected query per table) and precomputes them."""
+    missing = [factor for factor in factors if factor not in store['loaded']]
+    if not missing:
+        return
+    with store['lock']:
+        missing = [factor for factor in missing if factor not in store['loaded']]
+        if not missing:
+            return
+        tables = {}
+        for table, columns in required_columns(missing).items():
+            if table == 'destinations':
+                tables[table] = read_table(table, store['db_path'], columns)
+            else:
+                tables[table] = _align_aggregates(store, table, _read_aggregates(store, table, columns))
+        _prepare_factors(store, missing, tables, len(store['names']))
+
+def load_feature_store(db_path=DB_NAME):
+    """Returns the feature store for the current version of the database, rebuilding it if the file changed."""
+    version = get_database_version(db_path)
+    store = _FEATURE_STORES.get(db_path)
+    if store is None or store['version'] != version:
+        store = build_feature_store(db_path)
+        store['version'] = version
+        _FEATURE_STORES[db_path] = store
+    return store
+
+
+#NORMALISATION
+def value_range(values):
+    """Minimum and maximum ignoring missing values (NaN, NaN if there is nothing to compare)."""
+    values = values[~np.isnan(values)]
+    if values.size == 0:
+        return np.nan, np.nan
+    return values.min(), values.max()
+
+def normalize_factor(values, factor, lo, hi, kind=None):
+    """Turns raw factor values into 0-1 points using the minimum and maximum of the candidates."""
+    kind = kind or STATIC_FACTORS[factor][1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if kind == 'none':
+            scaled, valid = values, True
+        elif kind == 'share_of_max':
+            scaled, valid = values / hi, hi > 0
+        else:
+            scaled, valid = (values - lo) / (hi - lo), hi > lo
+            if kind == 'lower':
+                scaled = 1 - scaled
+            elif kind == 'closer':
+                scaled = (1 - scaled) ** 2
+    scaled = np.where(valid, scaled, CONSTANT_FACTOR_SCORE.get(factor, 0.0))
+    #MISSING VALUES RECEIVE NO POINTS
+    return np.where(np.isnan(values), 0.0, np.nan_to_num(scaled))
+
+
+#TRIP ORIGIN
+#DISTANCE IS READ FROM Distance_from_Lodz_km_road UNLESS THE USER GIVES AN ORIGIN (A DESTINATION NAME, {'lat': ..., 'lon': ...} OR
+#[LAT, LON]), THEN IT IS THE GREAT-CIRCLE DISTANCE TO EVERY DESTINATION. POINTS ONLY DEPEND ON HOW DISTANCES COMPARE, SO THE ROAD
+#FACTOR (ROAD KM PER GREAT-CIRCLE KM, CALIBRATED ON THE LODZ COLUMN) ONLY CHANGES THE DISTANCES REPORTED BY origin_distances
+EARTH_RADIUS_KM = 6371.0088
+LODZ = (51.7592, 19.4560)
+#DISTANCE VECTORS KEPT PER STORE FOR THE MOST RECENTLY USED ORIGINS
+ORIGIN_CACHE_SIZE = 64
+
+def haversine_km(lat, lon, origin_lat, origin_lon):
+    """Great-circle distance in km between arrays of coordinates and one point (all in degrees)."""
+    lat, lon, origin_lat, origin_lon = np.radians(lat), np.radians(lon), np.radians(origin_lat), np.radians(origin_lon)
+    a = np.sin((lat - origin_lat) / 2) ** 2 + np.cos(origin_lat) * np.cos(lat) * np.sin((lon - origin_lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+def origin_coordinates(store, origin):
+    """(lat, lon) of an origin given as a destination name, a {'lat', 'lon'} dict or a pair, None if it is unknown."""
+    if isinstance(origin, str):
+        load_factors(store, ['origin'])
+        ids, rows, starts = store['name_ids']['Destination']
+        i = ids.get(origin.lower())
+        if i is None:
+            return None
+        lat, lon = store['coordinates'][rows[starts[i]]]
+    elif isinstance(origin, dict):
+        lat, lon = origin.get('lat'), origin.get('lon')
+    elif isinstance(origin, (list, tuple)) and len(origin) == 2:
+        lat, lon = origin
+    else:
         return None
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
 
-    df_attr['attraction_popularity_rank'] = df_attr['No_votes'].rank(method='max', ascending=False)
-    max_rank = df_attr['attraction_popularity_rank'].max()
-    #ASSIGINNG POINTS FOR POPULARITY
-    df_attr['attraction_popularity_score'] = df_attr['attraction_popularity_rank'].apply(lambda r: calculate_attraction_popularity_score(r, max_rank))
-    #GROUPING BY DESTINATION
-    attr_grouped = df_attr.groupby('Destination').sum()
-    df = pd.merge(df_dest, attr_grouped, on='Destination', how='left')
-    
-    #EXCLUDING PLACES
-    excluded_places = preferences.get('excluded_places', [])
-    if excluded_places:
-        excluded_lower = [place.lower() for place in excluded_places]
-        df = df[~df['Country_x'].str.lower().isin(excluded_lower)]
-        df = df[~df['Destination'].str.lower().isin(excluded_lower)]
-    
-    df['score'] = 0.0
-    
-    #COEFFICIENT POINTS
-    #1. WEATHER (SHOW THE GRAPH IN EXCEL.)
-    #USER CHOOSES ONE MONTH AND PREFERABLE WEATHER, AND THE WEATHER FOR THIS MONTH IS COMPARED WITH THE DATABASE
-    month_col = preferences.get('month', '')[:3].capitalize()
-    if month_col and month_col in df.columns and weights.get('weather', 0) > 0:
-        def score_weather(current_weather):
-            max_allowed_distance = 3
-            weather_value = str(current_weather).strip().lower()
-            user_pref_lower = preferences.get('weather', '').lower()
-            try:
-                user_index = WEATHER_SCALE.index(user_pref_lower)
-                current_index = WEATHER_SCALE.index(weather_value)
-                distance = abs(user_index - current_index)
-                if distance > max_allowed_distance: return 0.0
-                else: return 1.0 - (distance / max_allowed_distance)
-            except ValueError: return 0.0
-        weather_score = df[month_col].apply(score_weather)
-        df['score'] += weights['weather'] * weather_score.fillna(0)
-
-    #2. BUDGET: SIMPLIFIED TO USE ONLY MIDRANGE COST
-    #NORMALISATION (CHEAPEST PLACE = 1, MOST EXPENSIVE = 0)
-    cost_col = 'Overall_Daily_Cost_MidRange_USD' # Hardcoded to MidRange
-    if cost_col in df.columns and df[cost_col].max() > 0 and weights.get('budget', 0) > 0:
-        cost_normalized = (df[cost_col] - df[cost_col].min()) / (df[cost_col].max() - df[cost_col].min())
-        budget_score = 1 - cost_normalized
-        df['score'] += weights['budget'] * budget_score.fillna(0)
-
-    #3,4 - ATTRACTION QUANTITY AND QUALITY
-    #EVERY ATTRACTION HAS SOME CATEGORIES ASSIGNED TO THEM, AND ATTRACTION QUANTITY COUNTS HOW MANY OF THESE CATEGORIES ALL 30 OF BEST ATTRACTIONS HAVE IN THE DESTINATION
-    #ALL ATTRACTIONS ALSO RECEIVE AN AVERAGE SCORE, WHICH IS THEN COMPUTED FOR ALL 30 OF THEM USING WEIGHTED AVERAGE, WITH NUMBER OF VOTES AS A WEIGHT
-    user_attractions = preferences.get('attractions', [])
+def road_factor(store):
+    """Median ratio of the road distance from Lodz to the great-circle distance from Lodz."""
+    load_factors(store, ['distance', 'origin'])
+    if 'road_factor' not in store:
+        great_circle = haversine_km(store['coordinates'][:, 0], store['coordinates'][:, 1], *LODZ)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratios = store['raw']['distance'] / great_circle
+        ratios = ratios[np.isfinite(ratios) & (great_circle > 50)]
+        store['road_factor'] = float(np.median(ratios)) if ratios.size else 1.0
+    return store['road_factor']
+
+def _origin_entry(store, origin):
+    """Cached {'distances': great-circle km to every destination} of an origin, None if the origin is unknown."""
+    coordinates = origin_coordinates(store, origin)
+    if coordinates is None:
+        return None
+    load_factors(store, ['origin'])
+    cache = store['origin_distances']
+    with store['lock']:
+        entry = cache.get(coordinates)
+        if entry is not None:
+            cache.move_to_end(coordinates)
+            return entry
+    entry = {'distances': haversine_km(store['coordinates'][:, 0], store['coordinates'][:, 1], *coordinates)}
+    with store['lock']:
+        cache[coordinates] = entry
+        while len(cache) > ORIGIN_CACHE_SIZE:
+            cache.popitem(last=False)
+    return entry
+
+def origin_distances(store, origin, road=False):
+    """Km from the origin to every destination (NaN without coordinates), estimated by road with road=True.
+
+    None if the origin is unknown.
+    """
+    entry = _origin_entry(store, origin)
+    if entry is None:
+        return None
+    return entry['distances'] * road_factor(store) if road else entry['distances']
+
+#SPATIAL INDEX
+#GRID OF LATITUDE/LONGITUDE CELLS: ROWS ARE SORTED BY CELL, SO A QUERY ONLY LOOKS AT THE CELLS IN THE BOUNDING BOX OF ITS CIRCLE
+#AND MEASURES THE EXACT DISTANCE TO THE ROWS IN THEM. "within_km" AND "nearest" PREFERENCES LIMIT THE CANDIDATES BEFORE SCORING
+SPATIAL_CELL_DEGREES = 1.0
+#AREA AROUND THE ORIGIN (LODZ IF THE USER DID NOT GIVE ONE): MAXIMUM DISTANCE IN KM AND NUMBER OF NEAREST DESTINATIONS
+AREA_PREFERENCES = ['within_km', 'nearest']
+
+def _lon_cell(lon, cell_degrees, n_lon):
+    """Grid column of longitudes in degrees, wrapped to [-180, 180) first (the last column is narrower if the cell does not divide 360)."""
+    return np.minimum((np.mod(np.asarray(lon) + 180, 360) // cell_degrees).astype(int), n_lon - 1)
+
+def build_spatial_index(lat, lon, cell_degrees=SPATIAL_CELL_DEGREES):
+    """Grid index of points given in degrees (points without coordinates are left out)."""
+    lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+    rows = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+    n_lat, n_lon = int(np.ceil(180 / cell_degrees)), int(np.ceil(360 / cell_degrees))
+    lat_cell = np.clip(((lat[rows] + 90) // cell_degrees).astype(int), 0, n_lat - 1)
+    lon_cell = _lon_cell(lon[rows], cell_degrees, n_lon)
+    cells = lat_cell * n_lon + lon_cell
+    order = np.argsort(cells, kind='stable')
+    return {'lat': lat, 'lon': lon, 'rows': rows[order], 'cells': cells[order], 'cell_degrees': cell_degrees, 'n_lat': n_lat, 'n_lon': n_lon}
+
+def within_radius(index, lat, lon, radius_km):
+    """Rows within radius_km (great circle) of a point, in row order."""
+    angle = radius_km / EARTH_RADIUS_KM
+    if angle < 0:
+        return np.empty(0, dtype=int)
+    if angle >= np.pi:
+        candidates = index['rows']
+    else:
+        cell, n_lon = index['cell_degrees'], index['n_lon']
+        lat_lo, lat_hi = lat - np.degrees(angle), lat + np.degrees(angle)
+        #WIDEST LONGITUDE SPAN OF THE CIRCLE, THE WHOLE CIRCLE OF LATITUDE IF IT REACHES A POLE
+        if lat_lo <= -90 or lat_hi >= 90 or np.sin(angle) >= np.cos(np.radians(lat)):
+            lon_ranges = [(0, n_lon - 1)]
+        else:
+            span = np.degrees(np.arcsin(np.sin(angle) / np.cos(np.radians(lat))))
+            first, last = int(_lon_cell(lon - span, cell, n_lon)), int(_lon_cell(lon + span, cell, n_lon))
+            #THE SPAN CROSSES THE ANTIMERIDIAN WHEN ITS ENDS WRAP INTO DIFFERENT TURNS OF 360 DEGREES
+            crosses = (lon - span + 180) // 360 != (lon + span + 180) // 360
+            if not crosses:
+                lon_ranges = [(first, last)]
+            elif first <= last:
+                lon_ranges = [(0, n_lon - 1)]
+            else:
+                lon_ranges = [(first, n_lon - 1), (0, last)]
+        lat_cells = range(max(int((lat_lo + 90) // cell), 0), min(int((lat_hi + 90) // cell), index['n_lat'] - 1) + 1)
+        starts = np.array([row * n_lon + lo for row in lat_cells for lo, _ in lon_ranges], dtype=int)
+        ends = np.array([row * n_lon + hi for row in lat_cells for _, hi in lon_ranges], dtype=int)
+        starts = np.searchsorted(index['cells'], starts, side='left')
+        ends = np.searchsorted(index['cells'], ends, side='right')
+        candidates = np.concatenate([index['rows'][start:end] for start, end in zip(starts, ends)] + [np.empty(0, dtype=int)])
+    distances = haversine_km(index['lat'][candidates], index['lon'][candidates], lat, lon)
+    return np.sort(candidates[distances <= radius_km])
+
+def nearest_rows(index, lat, lon, k):
+    """Rows of the k points nearest to a point, nearest first (equal distances in row order)."""
+    k = min(int(k), len(index['rows']))
+    if k <= 0:
+        return np.empty(0, dtype=int)
+    #THE RADIUS GROWS UNTIL IT HOLDS K POINTS, THE K NEAREST ARE THEN ALL INSIDE IT
+    radius = index['cell_degrees'] * np.pi / 180 * EARTH_RADIUS_KM
+    while True:
+        rows = within_radius(index, lat, lon, radius)
+        if len(rows) >= k or radius >= np.pi * EARTH_RADIUS_KM:
+            break
+        radius *= 2
+    distances = haversine_km(index['lat'][rows], index['lon'][rows], lat, lon)
+    return rows[np.lexsort((rows, distances))[:k]]
+
+def spatial_index(store):
+    load_factors(store, ['origin'])
+    return store['spatial_index']
+
+def _has_area(preferences):
+    return any(preferences.get(key) is not None for key in AREA_PREFERENCES)
+
+def _area_rows(store, preferences):
+    """Rows of the destinations in the area chosen by the user (all rows if there is none), in row order."""
+    if not _has_area(preferences):
+        return np.arange(len(store['names']))
+    center = LODZ if preferences.get('origin') is None else origin_coordinates(store, preferences['origin'])
+    if center is None:
+        return np.empty(0, dtype=int)
+    index = spatial_index(store)
+    rows = None
+    if preferences.get('within_km') is not None:
+        rows = within_radius(index, *center, float(preferences['within_km']))
+    if preferences.get('nearest') is not None:
+        nearest = np.sort(nearest_rows(index, *center, preferences['nearest']))
+        rows = nearest if rows is None else np.intersect1d(rows, nearest)
+    return rows
+
+
+#PROFILING
+#OFF BY DEFAULT: WHEN DISABLED THE ONLY COST IS ONE DICT LOOKUP PER REQUEST
+_PROFILE = {'enabled': False, 'allocations': False}
+#(MODE, STAGE) -> {'calls', 'seconds', 'rows', 'allocated_bytes'} SUMMED OVER ALL PROFILED REQUESTS
+_PROFILE_TOTALS = {}
+_PROFILE_LOCK = threading.Lock()
+
+def enable_profiling(allocations=False):
+    """Records time and rows of every scoring stage, and with allocations=True also the memory it allocates (slower)."""
+    _PROFILE.update(enabled=True, allocations=allocations)
+    if allocations and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def disable_profiling():
+    if _PROFILE['allocations'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _PROFILE.update(enabled=False, allocations=False)
+
+def _profiled(profile, stage, rows, fn, *args):
+    """Runs fn(*args), recording its wall time, rows and (if traced) peak allocated bytes under profile[stage]."""
+    traced = _PROFILE['allocations'] and tracemalloc.is_tracing()
+    if traced:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = fn(*args)
+    entry = {'seconds': time.perf_counter() - start, 'rows': rows}
+    if traced:
+        entry['allocated_bytes'] = tracemalloc.get_traced_memory()[1] - before
+    profile[stage] = entry
+    return result
+
+def _record_profile(mode, stages):
+    with _PROFILE_LOCK:
+        for stage, entry in stages.items():
+            totals = _PROFILE_TOTALS.setdefault((mode, stage), {'calls': 0, 'seconds': 0.0, 'rows': 0, 'allocated_bytes': 0})
+            totals['calls'] += 1
+            for key in ['seconds', 'rows', 'allocated_bytes']:
+                totals[key] += entry.get(key, 0)
+
+def get_profile_totals():
+    """Totals of every (mode, stage) since the start, or since reset_profile_totals."""
+    with _PROFILE_LOCK:
+        return {key: dict(totals) for key, totals in _PROFILE_TOTALS.items()}
+
+def reset_profile_totals():
+    with _PROFILE_LOCK:
+        _PROFILE_TOTALS.clear()
+
+def render_profile_metrics():
+    """Profile totals in the Prometheus text format."""
+    metrics = [('calls', 'recommender_stage_calls_total', 'Profiled runs of a scoring stage.'),
+               ('seconds', 'recommender_stage_seconds_total', 'Wall time spent in a scoring stage.'),
+               ('rows', 'recommender_stage_rows_total', 'Destinations processed by a scoring stage.'),
+               ('allocated_bytes', 'recommender_stage_allocated_bytes_total', 'Peak bytes allocated by a scoring stage (when traced).')]
+    totals = get_profile_totals()
+    lines = []
+    for key, name, help_text in metrics:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        lines += [f'{name}{{mode="{mode}",stage="{stage}"}} {values[key]}' for (mode, stage), values in sorted(totals.items())]
+    return '\n'.join(lines) + '\n'
+
+def write_profile_metrics(path):
+    """Writes the profile totals as a Prometheus text file (for the node exporter textfile collector)."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(render_profile_metrics())
+    os.replace(tmp_path, path)
+
+
+#SCORING
+def _is_active(factor, weight):
+    return weight > 0 or (factor in SIGNED_FACTORS and weight != 0)
+
+def excluded_rows(store, places):
+    """Rows of the destinations and of every destination of the countries named in places (in any case)."""
+    found = []
+    for place in places:
+        for ids, rows, starts in store['name_ids'].values():
+            i = ids.get(place.lower())
+            if i is not None:
+                found.append(rows[starts[i]:starts[i + 1]])
+    return np.concatenate(found) if found else np.empty(0, dtype=np.intp)
+
+def _candidate_rows(store, preferences):
+    """Row numbers of destinations in the user's area (if any) which were not excluded by the user."""
+    rows = _area_rows(store, preferences)
+    excluded = excluded_rows(store, preferences.get('excluded_places', []))
+    if excluded.size:
+        keep = np.ones(len(store['names']), dtype=bool)
+        keep[excluded] = False
+        rows = rows[keep[rows]]
+    return rows
+
+def _static_factor(store, factor, rows, all_rows):
+    if all_rows:
+        return store['factors'][factor]
+    values = store['raw'][factor][rows]
+    return normalize_factor(values, factor, *value_range(values))
+
+def _resolve_attractions(user_attractions):
     #USER CAN CHOOSE EVERYTHING
     attractions_to_score = ALL_ATTRACTION_GROUPS if (user_attractions and user_attractions[0].lower() == 'everything') else user_attractions
+    return [attr for attr in attractions_to_score if attr in ALL_ATTRACTION_GROUPS]
+
+def _factor_values(store, mode, factor, preferences, rows):
+    """Raw values of one factor for the candidate rows and how they are normalised, as (values, kind).
+
+    kind None means the values already are points, the result is None if the factor cannot be scored.
+    """
+    if factor == 'distance' and preferences.get('origin') is not None:
+        distances = origin_distances(store, preferences['origin'])
+        if distances is None:
+            return None
+        return distances[rows], 'closer'
+
+    if factor in STATIC_FACTORS:
+        return store['raw'][factor][rows], STATIC_FACTORS[factor][1]
+
+    if factor == 'weather' and mode == 'vacation':
+        #USER CHOOSES ONE MONTH AND PREFERABLE WEATHER, AND THE WEATHER FOR THIS MONTH IS COMPARED WITH THE DATABASE
+        month_col = (preferences.get('month') or '')[:3].capitalize()
+        if month_col not in MONTH_COLUMNS:
+            return None
+        return weather_points(preferences.get('weather', ''), store['weather_codes'][rows, MONTH_COLUMNS.index(month_col)]), None
+
+    if factor == 'weather':
+        #POINTS ARE SUMMED FOR THE WHOLE YEAR
+        if 'weather' not in preferences:
+            return None
+        return weather_points(preferences['weather'], store['weather_codes'][rows]).sum(axis=1), 'higher'
+
+    if factor == 'known_languages':
+        #ADDITIONAL POINTS IF USER WANTS TO "USE" THE LANGUAGE THEY KNOW
+        user_languages = preferences.get('known_languages', [])
+        if not user_languages:
+            return None
+        return np.isin(store['language_lower'][rows], [l.lower() for l in user_languages]).astype(float), None
+
+    valid_attractions = _resolve_attractions(preferences.get('attractions', []))
+    if not valid_attractions:
+        return None
+    if factor == 'attractions_quantity':
+        #HOW MANY OF THE CHOSEN CATEGORIES THE ATTRACTIONS IN THE DESTINATION HAVE
+        return store['group_counts'][valid_attractions].to_numpy()[rows].sum(axis=1), 'share_of_max'
+
+    #WEIGHTED AVERAGE RATING OF MATCHING ATTRACTIONS, WITH NUMBER OF VOTES AS A WEIGHT
+    return quality_matrix(store, np.array([group_mask(valid_attractions)]))[0][rows], 'higher'
+
+def _factor_vector(store, mode, factor, preferences, rows, all_rows):
+    """0-1 points of one factor for the candidate rows, or None if the factor cannot be scored."""
+    load_factors(store, [factor])
+    if factor == 'distance' and preferences.get('origin') is not None and all_rows:
+        #POINTS OVER THE WHOLE CATALOGUE ARE KEPT WITH THE DISTANCES OF THE ORIGIN
+        entry = _origin_entry(store, preferences['origin'])
+        if entry is None:
+            return None
+        if 'points' not in entry:
+            entry['points'] = normalize_factor(entry['distances'], factor, *value_range(entry['distances']))
+        return entry['points']
+    if factor in STATIC_FACTORS and not (factor == 'distance' and preferences.get('origin') is not None):
+        return _static_factor(store, factor, rows, all_rows)
+    raw = _factor_values(store, mode, factor, preferences, rows)
+    if raw is None:
+        return None
+    values, kind = raw
+    if kind is None:
+        return values
+    return normalize_factor(values, factor, *value_range(values), kind=kind)
+
+def score_destinations(store, mode, preferences, weights, profile=None):
+    """Weighted sum of factor points for every destination the user did not exclude.
 
-    if attractions_to_score:
-        valid_attractions = [attr for attr in attractions_to_score if attr in df.columns]
-        if valid_attractions:
-            if weights.get('attractions_quantity', 0) > 0:
-                quantity_score = df[valid_attractions].sum(axis=1)
-                if quantity_score.max() > 0:
-                    quantity_score_normalized = quantity_score / quantity_score.max()
-                    df['score'] += weights['attractions_quantity'] * quantity_score_normalized.fillna(0)
-
-            if weights.get('attractions_quality', 0) > 0:
-                mask = df_attr[valid_attractions].sum(axis=1) > 0
-                matching_attractions = df_attr[mask]
-                if not matching_attractions.empty:
-                    matching_attractions.loc[:, 'rating_x_votes'] = matching_attractions['Avg_rating'] * matching_attractions['No_votes']
-                    quality_grouped = matching_attractions.groupby('Destination').agg(rating_x_votes_sum=('rating_x_votes', 'sum'), no_votes_sum=('No_votes', 'sum'))
-                    quality_grouped['quality_score'] = quality_grouped['rating_x_votes_sum'] / quality_grouped['no_votes_sum'].replace(0, 1)
-                    df = pd.merge(df, quality_grouped[['quality_score']], on='Destination', how='left')
-                    if 'quality_score' in df.columns and df['quality_score'].max() > 0:
-                        quality_score_normalized = (df['quality_score'] - df['quality_score'].min()) / (df['quality_score'].max() - df['quality_score'].min())
-                        df['score'] += weights['attractions_quality'] * quality_score_normalized.fillna(0)
-    
-    #5. DISTANCE FROM LODZ
-    #CLOSEST LOCATION TO LODZ RECEIVES 100% OF POINTS (HERE, IT IS WARSAW), AND THE FURTHEST RECEIVES 0 POINTS, INCLUDING THESE, WHICH ARE ISLANDS (CAR TRAVEL)
-    dist_col = 'Distance_from_Lodz_km_road'
-    if dist_col in df.columns and weights.get('distance', 0) > 0:
-        distance_data = df[dist_col].copy()
-        nan_indices = distance_data.isna()
-        max_dist = distance_data[~nan_indices].max()
-        min_dist = distance_data[~nan_indices].min()
-        if max_dist > min_dist:
-            normalized_distance = (distance_data - min_dist) / (max_dist - min_dist)
-            distance_score = (1 - normalized_distance) ** 2
+    If a profile dict is given, every stage (and every numbered factor block) records its time and rows in it.
+    """
+    factor_order = VACATION_FACTORS if mode == 'vacation' else EMIGRATION_FACTORS
+    factors = [f for f in factor_order if _is_active(f, weights.get(f, 0))]
+    if profile is None:
+        rows = _candidate_rows(store, preferences)
+        load_factors(store, factors)
+    else:
+        rows = _profiled(profile, 'candidates', len(store['names']), _candidate_rows, store, preferences)
+        _profiled(profile, 'load_factors', len(store['names']), load_factors, store, factors)
+    all_rows = len(rows) == len(store['names'])
+    score = np.zeros(len(rows))
+    for factor in factors:
+        weight = weights[factor]
+        if profile is None:
+            points = _factor_vector(store, mode, factor, preferences, rows, all_rows)
         else:
-            distance_score = pd.Series(0.5, index=distance_data.index)
-        distance_score[nan_indices] = 0.0
-        df['score'] += weights['distance'] * distance_score.fillna(0)
+            stage = f"{factor_order.index(factor) + 1}_{factor}"
+            points = _profiled(profile, stage, len(rows), _factor_vector, store, mode, factor, preferences, rows, all_rows)
+        if points is not None:
+            score += weight * points
+    return rows, score
 
-    df.fillna(0, inplace=True)
+def top_k(scores, tie_order, k):
+    """Positions of the k best scores in every row (best first), equal scores are ordered by tie_order.
+
+    A partial selection finds the k-th best score, only the scores at least as good are sorted (with the ties of the k-th one).
+    """
+    scores = np.atleast_2d(np.where(np.isnan(scores), -np.inf, scores))
+    tie_order = np.asarray(tie_order)
+    p, n = scores.shape
+    k = max(min(k, n), 0)
+    if k == 0:
+        return np.empty((p, 0), dtype=np.intp)
+    threshold = -np.partition(-scores, k - 1, axis=1)[:, k - 1:k] if k < n else np.full((p, 1), -np.inf)
+    profile, position = np.nonzero(scores >= threshold)
+    #BEST SCORE FIRST IN EVERY ROW, EQUAL SCORES BY TIE ORDER (AND POSITION IF THAT IS EQUAL TOO)
+    order = np.lexsort((position, tie_order[position], -scores[profile, position], profile))
+    profile, position = profile[order], position[order]
+    starts = np.concatenate([[0], np.cumsum(np.bincount(profile, minlength=p))[:-1]])
+    keep = np.arange(len(profile)) - starts[profile] < k
+    return position[keep].reshape(p, k)
+
+def _results_frame(store, mode, rows, score, top_n):
+    #ONLY THE TOP_N BEST ARE SORTED, TIES ARE BROKEN BY DESTINATION NAME
+    best = top_k(score, store['name_rank'][rows], top_n)[0]
+    country_col = 'Country_x' if mode == 'vacation' else 'Country'
+    results = store['names'].iloc[rows[best]].rename(columns={'Country': country_col})
+    results['score'] = score[best]
+    return results
 
-    #6. SAFETY INDEX NORMALISED
-    if 'Safety_Index' in df.columns and weights.get('safety', 0) > 0:
-        safety_normalized = (df['Safety_Index'] - df['Safety_Index'].min()) / (df['Safety_Index'].max() - df['Safety_Index'].min())
-        df['score'] += weights['safety'] * safety_normalized
-        
-    #7. POPULARITY OF ALL ATTRACTIONS SUMMED UP, NORMALISED AND RANKED
-    pop_col_name = 'attraction_popularity_score'
-    if pop_col_name in df.columns and df[pop_col_name].max() > 0 and weights.get('attractions_popularity', 0) != 0:
-        pop_score_normalized = (df[pop_col_name] - df[pop_col_name].min()) / (df[pop_col_name].max() - df[pop_col_name].min())
-        df['score'] += weights['attractions_popularity'] * pop_score_normalized
-
-    #8. ENGLISH LEVEL (NORMALISED AS WELL)
-    epi_col = 'English_EPI_Score'
-    if epi_col in df.columns and weights.get('english_level', 0) > 0:
-        if df[epi_col].max() > df[epi_col].min():
-            epi_normalized = (df[epi_col] - df[epi_col].min()) / (df[epi_col].max() - df[epi_col].min())
-        else: epi_normalized = 0.5
-        df['score'] += weights['english_level'] * epi_normalized.fillna(0)
-        
-    #9. ADDITIONAL POINTS IF USER WANTS TO "USE" THE LANGUAGE THEY KNOW (EXCLUDING ENGLISH)
-    user_languages = preferences.get('known_languages', [])
-    if 'Language' in df.columns and user_languages and weights.get('known_languages', 0) > 0:
-        df['score'] += weights['known_languages'] * df['Language'].apply(lambda lang: 1.0 if str(lang).lower() in [l.lower() for l in user_languages] else 0.0)
 
-    #10. CUSINE QUALITY RANKING 
-    if 'Cuisine_Rank' in df.columns and weights.get('cuisine_quality', 0) > 0:
-        cuisine_score = df['Cuisine_Rank'].apply(calculate_cuisine_score)
-        df['score'] += weights['cuisine_quality'] * cuisine_score
+#RESULT CACHE
+#THE SAME SETTINGS ARE OFTEN REQUESTED AGAIN (SAME BUTTON CLICKED TWICE, PERSONAS SWITCHED BACK AND FORTH)
+RESULT_CACHE_SIZE = 256
+#WEIGHTS ON THE GRID OF THE APP SLIDERS ARE COMPARED IN STEPS
+WEIGHT_STEP = 0.05
+_RESULT_CACHE = OrderedDict()
+_CACHE_STATS = {'hits': 0, 'misses': 0}
+#THE CACHE IS SHARED BY THE THREADS OF server.py
+_CACHE_LOCK = threading.Lock()
 
-    results = df.sort_values(by='score', ascending=False)
-    display_cols = ['Destination', 'Country_x', 'score']
-    
-    return results[display_cols].head(top_n)
+def _canonical_weight(weight):
+    #SLIDER VALUES (0.15000000000000002 AND 0.15) ARE SNAPPED TO THE STEP, ANY OTHER WEIGHT IS KEPT AS IT IS
+    steps = weight / WEIGHT_STEP
+    return round(steps) if abs(steps - round(steps)) < 1e-6 else repr(float(weight))
+
+def canonical_request(mode, preferences, weights):
+    """Hash of the preferences and weights which is the same for every request giving the same recommendations."""
+    factors = VACATION_FACTORS if mode == 'vacation' else EMIGRATION_FACTORS
+    canonical = {
+        'mode': mode,
+        'weather': str(preferences['weather']).lower() if preferences.get('weather') is not None else None,
+        'known_languages': sorted({l.lower() for l in preferences.get('known_languages', [])}),
+        'excluded_places': sorted({place.lower() for place in preferences.get('excluded_places', [])}),
+        'origin': preferences['origin'].lower() if isinstance(preferences.get('origin'), str) else preferences.get('origin'),
+        **{key: preferences.get(key) for key in AREA_PREFERENCES},
+        #WEIGHTS WHICH DO NOT COUNT ARE THE SAME AS 0
+        'weights': [_canonical_weight(weights.get(f, 0)) if _is_active(f, weights.get(f, 0)) else 0 for f in factors],
+    }
+    if mode == 'vacation':
+        canonical['month'] = (preferences.get('month') or '')[:3].capitalize()
+        canonical['attractions'] = sorted(_resolve_attractions(preferences.get('attractions', [])))
+    return hashlib.sha1(json.dumps(canonical, sort_keys=True).encode()).hexdigest()
+
+def get_cache_stats():
+    """Hit and miss counters of the result cache."""
+    return {**_CACHE_STATS, 'size': len(_RESULT_CACHE), 'max_size': RESULT_CACHE_SIZE}
+
+def clear_result_cache():
+    with _CACHE_LOCK:
+        _RESULT_CACHE.clear()
+        _CACHE_STATS.update(hits=0, misses=0)
+
+def _cached_results(key):
+    """Copy of the cached results of (db_path, version, canonical request, top_n), None (counted as a miss) if there are none."""
+    with _CACHE_LOCK:
+        if key not in _RESULT_CACHE:
+            _CACHE_STATS['misses'] += 1
+            return None
+        _CACHE_STATS['hits'] += 1
+        _RESULT_CACHE.move_to_end(key)
+        return _RESULT_CACHE[key].copy()
+
+def _cache_results(key, results):
+    with _CACHE_LOCK:
+        #RESULTS FOR AN OLDER VERSION OF THE DATABASE ARE DROPPED
+        for old_key in [k for k in _RESULT_CACHE if k[0] == key[0] and k[1] != key[1]]:
+            del _RESULT_CACHE[old_key]
+        _RESULT_CACHE[key] = results.copy()
+        _RESULT_CACHE[key].attrs.pop('profile', None)
+        if len(_RESULT_CACHE) > RESULT_CACHE_SIZE:
+            _RESULT_CACHE.popitem(last=False)
+
+def _recommendations(mode, preferences, weights, top_n, db_path):
+    #PROFILE OF THIS REQUEST, ONLY WHEN PROFILING IS ENABLED
+    profile = {} if _PROFILE['enabled'] else None
+    start = time.perf_counter()
+    #ONLY READING THE DATABASE RETURNS None, INVALID PREFERENCES OR WEIGHTS RAISE
+    canonical = canonical_request(mode, preferences, weights)
+    try:
+        version = get_database_version(db_path)
+        key = (db_path, version, canonical, top_n)
+        results = _cached_results(key)
+        if results is not None:
+            if profile is not None:
+                results.attrs['profile'] = {'mode': mode, 'cache_hit': True, 'stages': {}, 'seconds': time.perf_counter() - start}
+            return results
+        if profile is None:
+            store = load_feature_store(db_path)
+        else:
+            store = _profiled(profile, 'load_store', 0, load_feature_store, db_path)
+    except Exception as e:
+        print(f"Error loading data from database: {e}")
+        return None
+    rows, score = score_destinations(store, mode, preferences, weights, profile)
+    if profile is None:
+        results = _results_frame(store, mode, rows, score, top_n)
+    else:
+        results = _profiled(profile, 'sort', len(rows), _results_frame, store, mode, rows, score, top_n)
+        _record_profile(mode, profile)
+        results.attrs['profile'] = {'mode': mode, 'cache_hit': False, 'stages': profile, 'seconds': time.perf_counter() - start}
+    _cache_results(key, results)
+    return results
+
+
+#VACATION RECOMMENDATION
+def get_vacation_recommendations(preferences, weights, top_n=10, db_path=DB_NAME):
+    #1. WEATHER IN THE CHOSEN MONTH, 2. BUDGET (MIDRANGE COST), 3,4. ATTRACTION QUANTITY AND QUALITY, 5. DISTANCE FROM LODZ,
+    #6. SAFETY, 7. POPULARITY OF ATTRACTIONS, 8. ENGLISH LEVEL, 9. KNOWN LANGUAGES, 10. CUISINE QUALITY
+    return _recommendations('vacation', preferences, weights, top_n, db_path)
 
 #EMIGRATION RECOMMENDATION
-def get_emigration_recommendations(preferences, weights, top_n=10):
-    #CONNECTING AS BEFORE
+def get_emigration_recommendations(preferences, weights, top_n=10, db_path=DB_NAME):
+    #1. WEATHER FOR THE WHOLE YEAR, 2. DISTANCE FROM LODZ, 3,4,5. COST OF LIVING, UNEMPLOYMENT, INFLATION (THE LOWER THE BETTER),
+    #6,7,8,9. PURCHASING POWER, SAFETY, HDI, LIFE EXPECTANCY (THE HIGHER THE BETTER), 10. ENGLISH, 11. KNOWN LANGUAGES
+    return _recommendations('emigration', preferences, weights, top_n, db_path)
+
+#SCORING SESSION
+#PREFERENCES WHICH EACH FACTOR DEPENDS ON (EXCLUDED PLACES CHANGE THE NORMALISATION OF EVERY FACTOR)
+FACTOR_INPUTS = {
+    'weather': ['month', 'weather'],
+    'attractions_quantity': ['attractions'],
+    'attractions_quality': ['attractions'],
+    'known_languages': ['known_languages'],
+    'distance': ['origin'],
+}
+
+class ScoringSession:
+    """Scores of one user which are updated incrementally while they tune the settings.
+
+    The points of every factor are kept, so changing a weight only sums the cached points again, and a factor
+    is recomputed only when the preferences it depends on change.
+    """
+
+    def __init__(self, mode, preferences, weights, db_path=DB_NAME):
+        self.mode = mode
+        self.db_path = db_path
+        self.factors = VACATION_FACTORS if mode == 'vacation' else EMIGRATION_FACTORS
+        self.store = None
+        self.update(preferences, weights)
+
+    def _weight(self, factor):
+        weight = self.weights.get(factor, 0)
+        return weight if _is_active(factor, weight) else 0.0
+
+    def _points(self, factor):
+        if factor not in self.points:
+            load_factors(self.store, [factor])
+            self.points[factor] = _factor_vector(self.store, self.mode, factor, self.preferences, self.rows, self.all_rows)
+        return self.points[factor]
+
+    def _reset(self, preferences, weights):
+        self.store = load_feature_store(self.db_path)
+        self.preferences, self.weights = dict(preferences), dict(weights)
+        self.rows = _candidate_rows(self.store, self.preferences)
+        self.all_rows = len(self.rows) == len(self.store['names'])
+        self.points = {}
+        load_factors(self.store, [factor for factor in self.factors if self._weight(factor) != 0])
+
+    @property
+    def score(self):
+        """Weighted sum of the cached points, summed like score_destinations so equal scores stay equal.
+
+        A running sum of weight changes would drift, and destinations with the same score would no longer be
+        ordered by name like in a fresh call of the recommendation functions.
+        """
+        score = np.zeros(len(self.rows))
+        for factor in self.factors:
+            weight = self._weight(factor)
+            if weight != 0 and self._points(factor) is not None:
+                score += weight * self.points[factor]
+        return score
+
+    def set_weight(self, factor, weight):
+        """Changes one weight, the points of the factor are computed if they were not needed before."""
+        self.weights[factor] = weight
+
+    def set_preferences(self, preferences):
+        """Changes preferences, dropping only the points of the factors which depend on the changed ones."""
+        changed = {key for key in set(preferences) | set(self.preferences) if preferences.get(key) != self.preferences.get(key)}
+        #THE CANDIDATES CHANGE WITH THE EXCLUDED PLACES AND THE AREA (WHICH IS AROUND THE ORIGIN)
+        area_changed = changed.intersection(AREA_PREFERENCES) or ('origin' in changed and (_has_area(preferences) or _has_area(self.preferences)))
+        if 'excluded_places' in changed or area_changed:
+            self._reset(preferences, self.weights)
+            return
+        self.preferences = dict(preferences)
+        for factor, inputs in FACTOR_INPUTS.items():
+            if changed.intersection(inputs):
+                self.points.pop(factor, None)
+
+    def update(self, preferences, weights):
+        """Applies the current settings of the user (rebuilds everything if the database changed)."""
+        if self.store is None or load_feature_store(self.db_path) is not self.store:
+            self._reset(preferences, weights)
+            return
+        self.set_preferences(preferences)
+        for factor in self.factors:
+            if weights.get(factor, 0) != self.weights.get(factor, 0):
+                self.set_weight(factor, weights.get(factor, 0))
+
+    def top(self, top_n=10):
+        """Best destinations for the current settings, in the same format as the recommendation functions.
+
+        Shares the result cache with them, so settings seen before (also by another user) are not scored again.
+        """
+        key = (self.db_path, self.store['version'], canonical_request(self.mode, self.preferences, self.weights), top_n)
+        results = _cached_results(key)
+        if results is None:
+            results = _results_frame(self.store, self.mode, self.rows, self.score, top_n)
+            _cache_results(key, results)
+        return results
+
+
+#BATCH SCORING
+#MANY (PREFERENCES, WEIGHTS) PROFILES ARE SCORED AT ONCE: EVERY FACTOR IS A LINEAR COMBINATION OF FIXED DESTINATION COLUMNS,
+#SO ALL SCORES ARE ONE (PROFILES x COLUMNS) @ (COLUMNS x DESTINATIONS) PRODUCT, PER PROFILE NORMALISATION ONLY CHANGES THE COEFFICIENTS
+def _masked_range(values, mask):
+    """Per profile minimum and maximum of values over the masked destinations (+inf, -inf if there are none)."""
+    lo = np.where(mask, values, np.inf).min(axis=1)
+    hi = np.where(mask, values, -np.inf).max(axis=1)
+    return lo, hi
+
+def _profile_groups(preferences_list, keys):
+    """Group of every profile by the values of the given preferences, and the first profile of every group."""
+    codes, groups = pd.factorize(pd.Series([json.dumps([prefs.get(key) for key in keys], sort_keys=True, default=str)
+                                            for prefs in preferences_list], dtype=object))
+    first = np.zeros(len(groups), dtype=int)
+    first[codes[::-1]] = np.arange(len(codes))[::-1]
+    return codes, first
+
+def _candidate_matrix(store, preferences_list):
+    """Profiles x destinations mask of destinations in the profile's area which were not excluded."""
+    n = len(store['names'])
+    candidates = np.ones((len(preferences_list), n), dtype=bool)
+    #EVERY DISTINCT EXCLUDED PLACE IS LOOKED UP ONCE, THEN ALL (PROFILE, ROW) PAIRS ARE CLEARED AT ONCE
+    pairs = [(i, place.lower()) for i, prefs in enumerate(preferences_list) for place in prefs.get('excluded_places', [])]
+    if pairs:
+        profiles, places = np.array([i for i, _ in pairs]), pd.Series([place for _, place in pairs], dtype=object)
+        place_ids, distinct = pd.factorize(places)
+        place_rows = [excluded_rows(store, [place]) for place in distinct]
+        sizes = np.array([len(rows) for rows in place_rows], dtype=int)
+        starts = np.cumsum(sizes) - sizes
+        lengths = sizes[place_ids]
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        rows = np.concatenate(place_rows)[np.repeat(starts[place_ids], lengths) + offsets]
+        candidates[np.repeat(profiles, lengths), rows] = False
+    #EVERY DISTINCT AREA IS SEARCHED ONCE
+    if any(_has_area(preferences) for preferences in preferences_list):
+        codes, first = _profile_groups(preferences_list, AREA_PREFERENCES + ['origin'])
+        in_area = np.ones((len(first), n), dtype=bool)
+        for group, i in enumerate(first):
+            if _has_area(preferences_list[i]):
+                in_area[group] = False
+                in_area[group, _area_rows(store, preferences_list[i])] = True
+        candidates &= in_area[codes]
+    return candidates
+
+def quality_matrix(store, masks):
+    """Profiles x destinations vote-weighted rating of attractions matching any group in the masks (NaN if none match)."""
+    table = store.get('quality_table')
+    if table is not None:
+        rating_x_votes_sum, no_votes_sum, has_matches = table['rating_x_votes'][masks], table['no_votes'][masks], table['matches'][masks]
+    else:
+        #CATALOGUE TOO BIG FOR THE TABLE, MATCHING ATTRACTIONS ARE SUMMED ON THE FLY
+        group_masks = store['group_masks']
+        n = len(store['names'])
+        matches = (group_masks['Group_Mask'].to_numpy()[:, None] & masks[None, :]) != 0
+        sums = []
+        for col in ['Rating_x_votes_Sum', 'No_votes_Sum', 'Attraction_Count']:
+            total = np.zeros((n, len(masks)))
+            np.add.at(total, group_masks['dest_row'].to_numpy(), matches * group_masks[col].to_numpy()[:, None])
+            sums.append(total.T)
+        rating_x_votes_sum, no_votes_sum, has_matches = sums[0], sums[1], sums[2] > 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(has_matches, rating_x_votes_sum / np.where(no_votes_sum == 0, 1, no_votes_sum), np.nan)
+
+def score_profiles(store, mode, profiles):
+    """Scores of every destination (columns) for every (preferences, weights) profile (rows) and the mask of candidates."""
+    factors = VACATION_FACTORS if mode == 'vacation' else EMIGRATION_FACTORS
+    preferences_list = [preferences for preferences, _ in profiles]
+    n, p = len(store['names']), len(profiles)
+    weights = np.array([[w.get(f, 0) if _is_active(f, w.get(f, 0)) else 0.0 for f in factors] for _, w in profiles],
+                       dtype=float).reshape(p, len(factors))
+    candidates = _candidate_matrix(store, preferences_list)
+    #FACTORS NOBODY USES ADD NOTHING, SO THEIR COLUMNS ARE NOT LOADED
+    used = [factor for i, factor in enumerate(factors) if weights[:, i].any()]
+    load_factors(store, used)
+    columns, coefficients = [np.zeros(n)], [np.zeros(p)]
+    adjustment = np.zeros((p, n))
+
+    #DISTANCE FROM A CHOSEN ORIGIN IS DIFFERENT FOR EVERY PROFILE, IT IS ADDED AS A PER PROFILE ADJUSTMENT BELOW
+    has_origin = np.array([prefs.get('origin') is not None for prefs in preferences_list], dtype=bool).reshape(p)
+
+    #FACTORS WHICH ARE THE SAME FOR EVERYONE, RESCALED TO 0-1 OVER THE WHOLE CATALOGUE AND THEN AGAIN OVER EACH PROFILE'S CANDIDATES
+    for factor in used:
+        if factor not in STATIC_FACTORS:
+            continue
+        w = weights[:, factors.index(factor)] * (~has_origin if factor == 'distance' else 1)
+        raw = store['raw'][factor]
+        kind = STATIC_FACTORS[factor][1]
+        if kind == 'none':
+            columns.append(np.nan_to_num(raw)); coefficients.append(w)
+            continue
+        has_value = ~np.isnan(raw)
+        lo, hi = value_range(raw)
+        scaled = np.nan_to_num((raw - lo) / (hi - lo)) if hi > lo else np.zeros(n)
+        s_lo, s_hi = _masked_range(scaled, candidates & has_value)
+        valid = s_hi > s_lo
+        s_lo, s_hi = np.where(valid, s_lo, 0.0), np.where(valid, s_hi, 0.0)
+        span = np.where(valid, s_hi - s_lo, 1.0)
+        const = np.where(valid, 0.0, CONSTANT_FACTOR_SCORE.get(factor, 0.0))
+        if kind == 'higher':
+            columns += [scaled, has_value]; coefficients += [w * valid / span, w * (const - valid * s_lo / span)]
+        elif kind == 'lower':
+            columns += [scaled, has_value]; coefficients += [-w * valid / span, w * (const + valid * s_hi / span)]
+        else:
+            #(HI - X)^2 / SPAN^2 EXPANDED INTO X^2, X AND A CONSTANT
+            columns += [scaled ** 2, scaled, has_value]
+            coefficients += [w * valid / span ** 2, -2 * w * valid * s_hi / span ** 2, w * (const + valid * s_hi ** 2 / span ** 2)]
+
+    if 'distance' in used and has_origin.any():
+        #EVERY DISTINCT ORIGIN IS MEASURED ONCE, THEN RESCALED OVER THE CANDIDATES OF EACH PROFILE
+        w = weights[:, factors.index('distance')]
+        codes, first = _profile_groups(preferences_list, ['origin'])
+        distances = np.full((len(first), n), np.nan)
+        known = np.zeros(len(first), dtype=bool)
+        for group, i in enumerate(first):
+            origin = preferences_list[i].get('origin')
+            group_distances = origin_distances(store, origin) if origin is not None else None
+            if group_distances is not None:
+                distances[group], known[group] = group_distances, True
+        scored = has_origin & (w != 0) & known[codes]
+        origin_distance = distances[codes[scored]]
+        lo, hi = _masked_range(origin_distance, candidates[scored] & ~np.isnan(origin_distance))
+        adjustment[scored] += w[scored, None] * normalize_factor(origin_distance, 'distance', lo[:, None], hi[:, None])
+
+    #WEATHER: EVERY PROFILE PICKS ONE (MONTH, PREFERENCE) COLUMN IN VACATION MODE, OR ONE YEARLY TOTAL IN EMIGRATION MODE
+    w = weights[:, factors.index('weather')]
+    table = WEATHER_MATCH_TABLE[:, store['weather_codes']] if 'weather' in used else np.zeros((len(WEATHER_SCALE), n, len(MONTH_COLUMNS)))
+    #PREFERRED WEATHER AND MONTH OF EVERY PROFILE AS POSITIONS IN WEATHER_SCALE AND MONTH_COLUMNS (-1 IF UNKNOWN)
+    preferred = pd.Index(WEATHER_SCALE).get_indexer(pd.Series([prefs.get('weather', '') for prefs in preferences_list], dtype=object)
+                                                   .astype(str).str.lower())
+    if mode == 'vacation':
+        months = pd.Index(MONTH_COLUMNS).get_indexer(pd.Series([prefs.get('month', '') for prefs in preferences_list], dtype=object)
+                                                     .str[:3].str.capitalize())
+        coef = np.zeros((p, len(WEATHER_SCALE), len(MONTH_COLUMNS)))
+        scored = (preferred >= 0) & (months >= 0)
+        coef[np.flatnonzero(scored), preferred[scored], months[scored]] = w[scored]
+        columns += list(table.transpose(0, 2, 1).reshape(-1, n)); coefficients += list(coef.reshape(p, len(WEATHER_SCALE) * len(MONTH_COLUMNS)).T)
+    else:
+        totals = table.sum(axis=2)
+        scored = (preferred >= 0) & np.array(['weather' in prefs for prefs in preferences_list], dtype=bool).reshape(p)
+        t_lo, t_hi = _masked_range(totals[np.maximum(preferred, 0)], candidates)
+        valid = scored & (t_hi > t_lo)
+        span = np.where(valid, t_hi - t_lo, 1.0)
+        coef = np.zeros((p, len(WEATHER_SCALE)))
+        coef[np.flatnonzero(valid), preferred[valid]] = (w / span)[valid]
+        columns += list(totals) + [np.ones(n)]; coefficients += list(coef.T) + [-w * np.where(valid, t_lo, 0.0) / span]
+
+    #KNOWN LANGUAGES: ONE COLUMN PER LANGUAGE IN THE CATALOGUE
+    w = weights[:, factors.index('known_languages')]
+    language_lower = store['language_lower'] if 'known_languages' in used else np.array([], dtype=object)
+    languages = np.unique(language_lower)
+    coef = np.zeros((p, len(languages)))
+    known = pd.DataFrame([(i, l.lower()) for i, prefs in enumerate(preferences_list) for l in prefs.get('known_languages', [])],
+                         columns=['profile', 'language'])
+    known = known[known['language'].isin(languages)]
+    known_profiles = known['profile'].to_numpy(dtype=int)
+    coef[known_profiles, np.searchsorted(languages, known['language'].to_numpy())] = w[known_profiles]
+    columns += list((language_lower[None, :] == languages[:, None]).astype(float)); coefficients += list(coef.T)
+
+    #ATTRACTIONS: QUANTITY IS LINEAR IN THE GROUP COUNTS, QUALITY IS A PER PROFILE ADJUSTMENT
+    if mode == 'vacation':
+        selected = np.zeros((p, len(ALL_ATTRACTION_GROUPS)))
+        picks = [(i, ALL_ATTRACTION_GROUPS.index(g)) for i, prefs in enumerate(preferences_list) for g in _resolve_attractions(prefs.get('attractions', []))]
+        if picks:
+            np.add.at(selected, tuple(np.array(picks).T), 1)
+        group_counts = store['group_counts'][ALL_ATTRACTION_GROUPS].to_numpy() if 'attractions_quantity' in used else np.zeros((n, len(ALL_ATTRACTION_GROUPS)))
+        w = weights[:, factors.index('attractions_quantity')]
+        _, q_hi = _masked_range(selected @ group_counts.T, candidates)
+        q_scale = np.where(q_hi > 0, w / np.where(q_hi > 0, q_hi, 1.0), 0.0)
+        columns += list(group_counts.T); coefficients += list((selected * q_scale[:, None]).T)
+
+        w = weights[:, factors.index('attractions_quality')]
+        scored = (w != 0) & (selected.sum(axis=1) > 0)
+        if scored.any():
+            quality = quality_matrix(store, (selected[scored] > 0) @ GROUP_BITS)
+            mask = candidates[scored] & ~np.isnan(quality)
+            r_lo, r_hi = _masked_range(quality, mask)
+            valid = r_hi > r_lo
+            span = np.where(valid, r_hi - r_lo, 1.0)[:, None]
+            with np.errstate(invalid='ignore'):
+                points = np.where(valid[:, None], np.nan_to_num((quality - r_lo[:, None]) / span), 0.0)
+            adjustment[scored] += w[scored, None] * points
+
+    scores = np.column_stack(coefficients) @ np.vstack(columns).astype(float) + adjustment
+    return scores, candidates
+
+def get_batch_recommendations(mode, profiles, top_n=10, db_path=DB_NAME):
+    """Top destinations for many (preferences, weights) profiles, one row per (profile, rank)."""
     try:
-        conn = sqlite3.connect("travel_recommendation_final.db")
-        df = pd.read_sql_query("SELECT * FROM destinations", conn)
-        conn.close()
+        store = load_feature_store(db_path)
     except Exception as e:
         print(f"Error loading data from database: {e}")
         return None
+    scores, candidates = score_profiles(store, mode, profiles)
+    scores = np.where(candidates, scores, -np.inf)
+    order = top_k(scores, store['name_rank'], top_n)
+    profile = np.repeat(np.arange(len(profiles)), order.shape[1])
+    keep = candidates[profile, order.ravel()]
+    results = store['names'].iloc[order.ravel()[keep]].reset_index(drop=True)
+    results.insert(0, 'profile', profile[keep])
+    results.insert(1, 'rank', np.tile(np.arange(1, order.shape[1] + 1), len(profiles))[keep])
+    results['score'] = scores[profile[keep], order.ravel()[keep]]
+    return results
 
-    excluded_places = preferences.get('excluded_places', [])
-    if excluded_places:
-        excluded_lower = [place.lower() for place in excluded_places]
-        df = df[~df['Country'].str.lower().isin(excluded_lower)]
-        df = df[~df['Destination'].str.lower().isin(excluded_lower)]
-        
-    df['score'] = 0.0
-    
-    #1. WEATHER, BUT HERE, POINTS ARE SUMMED FOR THE WHOLE YEAR
-    if weights.get('weather', 0) > 0 and 'weather' in preferences:
-        month_cols = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-        df['total_weather_score'] = 0.0
-        def score_weather(current_weather):
-            max_allowed_distance = 3
-            weather_value = str(current_weather).strip().lower()
-            user_pref_lower = preferences['weather'].lower()
+#STREAMING
+#CATALOGUES WHICH DO NOT FIT IN MEMORY ARE READ FROM SQLITE IN RANGES OF Destination_ID: A FIRST PASS READS ONLY THE COLUMNS OF
+#NORMALISED FACTORS AND COLLECTS THEIR MINIMUM AND MAXIMUM OVER THE CANDIDATES, THE SECOND PASS SCORES EVERY CHUNK WITH THESE
+#GLOBAL RANGES (SO SCORES ARE THE SAME AS IN MEMORY) AND KEEPS ONLY THE TOP_N IN A HEAP. MEMORY IS O(CHUNK + TOP_N)
+STREAM_CHUNK_SIZE = 10000
+#TABLES READ BY Destination_ID RANGES, database_creator.py AND synthetic_data.py INDEX THEM
+INDEXED_TABLES = ['destinations', 'destination_aggregates', 'destination_group_masks']
+
+def create_destination_indexes(conn):
+    """Indexes Destination_ID of the tables read in ranges (without them every chunk scans the whole table)."""
+    for table in INDEXED_TABLES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_destination_id ON {table} (Destination_ID)")
+
+class _Reversed:
+    """Heap key which orders the other way round (a larger name is worse in a tie)."""
+    __slots__ = ['value']
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return self.value > other.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+def _is_normalised(mode, factor):
+    """Whether the points of a factor depend on the minimum or maximum over the candidates."""
+    if factor in STATIC_FACTORS:
+        return STATIC_FACTORS[factor][1] != 'none'
+    return factor in ['attractions_quantity', 'attractions_quality'] or (factor == 'weather' and mode == 'emigration')
+
+def _count_destinations(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM destinations").fetchone()[0]
+    finally:
+        conn.close()
+
+def _stream_chunks(db_path, factors, chunk_size, catalogue_size):
+    """Chunks of the catalogue as small stores with the given factors precomputed, and the rowid of every row."""
+    conn = sqlite3.connect(db_path)
+    try:
+        first, last = conn.execute("SELECT MIN(Destination_ID), MAX(Destination_ID) FROM destinations").fetchone()
+        if first is None:
+            return
+        columns = required_columns(factors)
+        dest_columns = BASE_COLUMNS + [col for col in columns.pop('destinations', []) if col not in BASE_COLUMNS]
+        selected = ', '.join(f'"{col}"' for col in dest_columns)
+        for start in range(int(first), int(last) + 1, chunk_size):
+            bounds = (start, start + chunk_size)
+            #ROWID ORDER IS THE ORDER OF THE IN-MEMORY STORE, SO EQUAL SCORES ARE BROKEN IN THE SAME WAY
+            df_dest = pd.read_sql_query(f"SELECT rowid AS row_id, {selected} FROM destinations "
+                                        "WHERE Destination_ID >= ? AND Destination_ID < ? ORDER BY rowid", conn, params=bounds)
+            if df_dest.empty:
+                continue
+            store = _base_store(df_dest, db_path)
+            tables = {'destinations': df_dest}
+            for table, cols in columns.items():
+                frame = pd.read_sql_query(f"SELECT {', '.join(['Destination_ID'] + cols)} FROM {table} "
+                                          "WHERE Destination_ID >= ? AND Destination_ID < ? ORDER BY rowid", conn, params=bounds)
+                tables[table] = _align_aggregates(store, table, frame)
+            _prepare_factors(store, factors, tables, catalogue_size)
+            yield store, df_dest['row_id'].to_numpy()
+    finally:
+        conn.close()
+
+def _with_origin(factors, preferences):
+    """Factors to load for a chunk, with the coordinates if the distance is measured from an origin or there is an area."""
+    uses_origin = ('distance' in factors and preferences.get('origin') is not None) or _has_area(preferences)
+    return factors + ['origin'] if uses_origin else factors
+
+def _locate_origin(preferences, db_paths):
+    """Preferences with an origin given by name replaced by its coordinates (chunks do not know the other destinations)."""
+    origin = preferences.get('origin')
+    if not isinstance(origin, str):
+        return preferences
+    for db_path in db_paths:
+        conn = sqlite3.connect(db_path)
+        try:
+            #THE FIRST DESTINATION WITH THE NAME, LIKE IN THE IN-MEMORY STORE
+            for destination, lat, lon in conn.execute("SELECT Destination, Latitude, Longitude FROM destinations ORDER BY rowid"):
+                if str(destination).lower() == origin.lower():
+                    return {**preferences, 'origin': {'lat': lat, 'lon': lon}}
+        finally:
+            conn.close()
+    return {**preferences, 'origin': {}}
+
+def _locate_area(preferences, db_paths):
+    """Preferences with 'nearest' replaced by the radius which holds the nearest destinations of all databases
+    (chunks only see their own destinations). Destinations at exactly the same distance as the last one are also kept.
+    """
+    if preferences.get('nearest') is None:
+        return preferences
+    k = int(preferences['nearest'])
+    center = LODZ if preferences.get('origin') is None else origin_coordinates(None, preferences['origin'])
+    nearest = np.empty(0)
+    if center is not None and k > 0:
+        for db_path in db_paths:
+            conn = sqlite3.connect(db_path)
             try:
-                user_index = WEATHER_SCALE.index(user_pref_lower)
-                current_index = WEATHER_SCALE.index(weather_value)
-                distance = abs(user_index - current_index)
-                if distance > max_allowed_distance: return 0.0
-                else: return 1.0 - (distance / max_allowed_distance)
-            except ValueError: return 0.0
-        for month_col in month_cols:
-            if month_col in df.columns:
-                monthly_score = df[month_col].apply(score_weather)
-                df['total_weather_score'] += monthly_score.fillna(0)
-        if df['total_weather_score'].max() > 0:
-            weather_score_normalized = (df['total_weather_score'] - df['total_weather_score'].min()) / (df['total_weather_score'].max() - df['total_weather_score'].min())
-            df['score'] += weights['weather'] * weather_score_normalized
-        
-    #2.Distance from Lodz (SAME AS IN TOURISM)
-    dist_col = 'Distance_from_Lodz_km_road'
-    if dist_col in df.columns and weights.get('distance', 0) > 0:
-        distance_data = df[dist_col].copy()
-        nan_indices = distance_data.isna()
-        max_dist = distance_data[~nan_indices].max()
-        min_dist = distance_data[~nan_indices].min()
-        if max_dist > min_dist:
-            normalized_distance = (distance_data - min_dist) / (max_dist - min_dist)
-            distance_score = (1 - normalized_distance) ** 2
+                cursor = conn.execute("SELECT Latitude, Longitude FROM destinations")
+                while True:
+                    chunk = cursor.fetchmany(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    coordinates = pd.DataFrame(chunk, columns=['lat', 'lon']).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+                    distances = haversine_km(coordinates[:, 0], coordinates[:, 1], *center)
+                    nearest = np.sort(np.concatenate([nearest, distances[np.isfinite(distances)]]))[:k]
+            finally:
+                conn.close()
+    if center is None or k <= 0:
+        radius = -1.0
+    elif len(nearest) < k:
+        radius = np.inf
+    else:
+        #DISTANCES IN A CHUNK CAN DIFFER IN THE LAST BIT FROM THE ONES MEASURED HERE
+        radius = nearest[-1] * (1 + 1e-12)
+    if preferences.get('within_km') is not None:
+        radius = min(radius, float(preferences['within_km']))
+    return {**preferences, 'within_km': radius, 'nearest': None}
+
+def _stream_ranges(db_path, mode, preferences, factors, chunk_size, catalogue_size):
+    """Pass 1 over one database: {factor: (min, max)} of the normalised factors over its candidates."""
+    ranges = {}
+    normalised = [f for f in factors if _is_normalised(mode, f)]
+    for store, _ in _stream_chunks(db_path, _with_origin(normalised, preferences), chunk_size, catalogue_size):
+        rows = _candidate_rows(store, preferences)
+        for factor in normalised:
+            raw = _factor_values(store, mode, factor, preferences, rows)
+            if raw is not None:
+                ranges = _merge_ranges([ranges, {factor: value_range(raw[0])}])
+    return ranges
+
+def _merge_ranges(ranges_list):
+    """Minimum and maximum of every factor over several {factor: (min, max)} dicts."""
+    merged = {}
+    for ranges in ranges_list:
+        for factor, (lo, hi) in ranges.items():
+            merged_lo, merged_hi = merged.get(factor, (np.nan, np.nan))
+            merged[factor] = (np.fmin(merged_lo, lo), np.fmax(merged_hi, hi))
+    return merged
+
+def _stream_top(db_path, mode, preferences, weights, factors, ranges, top_n, chunk_size, catalogue_size, shard=0):
+    """Pass 2 over one database: its top_n as (score for ranking, destination, shard, rowid, score, country), best first."""
+    heap = []
+    for store, row_ids in _stream_chunks(db_path, _with_origin(factors, preferences), chunk_size, catalogue_size):
+        rows = _candidate_rows(store, preferences)
+        score = np.zeros(len(rows))
+        for factor in factors:
+            raw = _factor_values(store, mode, factor, preferences, rows)
+            if raw is None:
+                continue
+            values, kind = raw
+            points = values if kind is None else normalize_factor(values, factor, *ranges.get(factor, (np.nan, np.nan)), kind=kind)
+            score += weights[factor] * points
+        #ONLY THE TOP_N OF THE CHUNK CAN GET INTO THE OVERALL TOP_N, THE HEAP ROOT IS THE WORST OF THE BEST SO FAR
+        for i in top_k(score, store['name_rank'][rows], top_n)[0]:
+            row = rows[i]
+            destination, country = store['names'].iloc[row]
+            ranked = -np.inf if np.isnan(score[i]) else float(score[i])
+            item = (ranked, _Reversed((destination, shard, int(row_ids[row]))), float(score[i]), country)
+            if len(heap) < top_n:
+                heapq.heappush(heap, item)
+            elif item[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, item)
+    best = sorted(heap, key=lambda item: item[:2], reverse=True)
+    return [(ranked, *key.value, score, country) for ranked, key, score, country in best]
+
+def _top_frame(mode, items, top_n):
+    """Results frame of the best top_n items of one or more _stream_top lists (equal scores are ordered by name)."""
+    best = sorted(items, key=lambda item: (-item[0], item[1], item[2], item[3]))[:top_n]
+    country_col = 'Country_x' if mode == 'vacation' else 'Country'
+    return pd.DataFrame({'Destination': [item[1] for item in best], country_col: [item[5] for item in best],
+                         'score': [item[4] for item in best]}, index=[item[3] - 1 for item in best])
+
+def stream_recommendations(mode, preferences, weights, top_n=10, db_path=DB_NAME, chunk_size=STREAM_CHUNK_SIZE):
+    """Same results as get_vacation/emigration_recommendations, computed without loading the catalogue into memory."""
+    factor_order = VACATION_FACTORS if mode == 'vacation' else EMIGRATION_FACTORS
+    factors = [f for f in factor_order if _is_active(f, weights.get(f, 0))]
+    try:
+        preferences = _locate_origin(preferences, [db_path])
+        preferences = _locate_area(preferences, [db_path])
+        catalogue_size = _count_destinations(db_path)
+        #PASS 1: GLOBAL RANGES OF THE FACTORS WHICH ARE NORMALISED, PASS 2: SCORES AND THE TOP_N
+        ranges = _stream_ranges(db_path, mode, preferences, factors, chunk_size, catalogue_size)
+        items = _stream_top(db_path, mode, preferences, weights, factors, ranges, top_n, chunk_size, catalogue_size)
+    except Exception as e:
+        print(f"Error loading data from database: {e}")
+        return None
+    return _top_frame(mode, items, top_n)
+
+
+#SHARDED CATALOGUES
+#THE CATALOGUE CAN BE SPLIT INTO SEVERAL DATABASES (E.G. ONE PER REGION, SEE shards.py) WHICH ARE UPDATED INDEPENDENTLY.
+#EVERY SHARD IS STREAMED IN ITS OWN PROCESS: THE RANGES OF ALL SHARDS ARE MERGED FIRST, SO POINTS ARE NORMALISED OVER THE WHOLE
+#CATALOGUE, AND THEN THE TOP_N LISTS OF THE SHARDS ARE MERGED. THE RESULT IS THE SAME AS FOR ONE DATABASE WITH THE SHARDS IN ORDER
+def get_sharded_recommendations(mode, preferences, weights, shard_paths, top_n=10, workers=None, executor=None,
+                                chunk_size=STREAM_CHUNK_SIZE):
+    """Top destinations over several shard databases (an executor can be passed to reuse its worker processes)."""
+    factor_order = VACATION_FACTORS if mode == 'vacation' else EMIGRATION_FACTORS
+    factors = [f for f in factor_order if _is_active(f, weights.get(f, 0))]
+    pool = executor or ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, max(len(shard_paths), 1)))
+    try:
+        preferences = _locate_origin(preferences, shard_paths)
+        preferences = _locate_area(preferences, shard_paths)
+        catalogue_size = sum(pool.map(_count_destinations, shard_paths))
+        ranges = _merge_ranges(pool.map(partial(_stream_ranges, mode=mode, preferences=preferences, factors=factors,
+                                                chunk_size=chunk_size, catalogue_size=catalogue_size), shard_paths))
+        futures = [pool.submit(_stream_top, path, mode, preferences, weights, factors, ranges, top_n, chunk_size, catalogue_size, shard)
+                   for shard, path in enumerate(shard_paths)]
+        items = [item for future in futures for item in future.result()]
+    except Exception as e:
+        print(f"Error loading data from database: {e}")
+        return None
+    finally:
+        if executor is None:
+            pool.shutdown()
+    #THE INDEX OF A SHARDED RESULT IS ITS RANK
+    return _top_frame(mode, items, top_n).reset_index(drop=True)
+
+#BULK SCORING
+#PROFILES ARE SENT TO THE WORKERS IN CHUNKS AND EVERY CHUNK IS SCORED WITH get_batch_recommendations
+BULK_CHUNK_SIZE = 256
+
+def read_profiles(path):
+    """Yields (mode, preferences, weights) of every profile in a JSONL file, or a CSV file with preferences and weights as JSON.
+
+    A profile which cannot be parsed is yielded as the error message, so the output keeps one line per input line.
+    """
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.lower().endswith('.csv'):
+            rows = csv.DictReader(f)
         else:
-            distance_score = pd.Series(0.5, index=distance_data.index)
-        distance_score[nan_indices] = 0.0
-        df['score'] += weights['distance'] * distance_score.fillna(0)
-
-    df.fillna(0, inplace=True)
-    
-    #3,4,5. COST OF LIVING INDEX, UNEMPLOYMENT, INFLATION, THE LOWER THE BETTER, NORMALISED
-    for col, weight in [('CostofLivingPlusRentIndex', 'cost_of_living'), ('Unemployment_Rate_National_Latest_Pct', 'unemployment'), ('Inflation_Rate_National_Latest_Pct', 'inflation')]:
-        if col in df.columns and weights.get(weight, 0) > 0:
-            if df[col].max() > df[col].min():
-                normalized = (df[col] - df[col].min()) / (df[col].max() - df[col].min())
-                df['score'] += weights[weight] * (1 - normalized)
-
-    #6,7,8,9 PURCHASING POWER, SAFETY INDEX, HDI, LIFE EXPECTANCY, THE HIGHER THE BETTER
-    for col, weight in [('LocalPurchasingPowerIndex', 'purchasing_power'), ('Safety_Index', 'safety'), ('HDI_Value_Latest', 'hdi'), ('Life_Expectancy', 'life_expectancy')]:
-        if col in df.columns and weights.get(weight, 0) > 0:
-            if df[col].max() > df[col].min():
-                normalized = (df[col] - df[col].min()) / (df[col].max() - df[col].min())
-                df['score'] += weights[weight] * normalized
-
-    #10. ENGLISH (SAME AS BEFORE)
-    epi_col = 'English_EPI_Score'
-    if epi_col in df.columns and weights.get('english_level', 0) > 0:
-        if df[epi_col].max() > df[epi_col].min():
-            epi_normalized = (df[epi_col] - df[epi_col].min()) / (df[epi_col].max() - df[epi_col].min())
-        else: epi_normalized = 0.5
-        df['score'] += weights['english_level'] * epi_normalized.fillna(0)
-    #ADDITIONAL LANGUAGES (SAME AS BEFORE)   
-    user_languages = preferences.get('known_languages', [])
-    if 'Language' in df.columns and user_languages and weights.get('known_languages', 0) > 0:
-        df['score'] += weights['known_languages'] * df['Language'].apply(lambda lang: 1.0 if str(lang).lower() in [l.lower() for l in user_languages] else 0.0)
-
-    results = df.sort_values(by='score', ascending=False)
-    display_cols = ['Destination', 'Country', 'score']
-    
-    return results[display_cols].head(top_n)
+            rows = (line for line in f if line.strip())
+        for row in rows:
+            try:
+                profile = row if isinstance(row, dict) else json.loads(row)
+                preferences, weights = profile.get('preferences') or {}, profile.get('weights') or {}
+                if isinstance(preferences, str): preferences = json.loads(preferences)
+                if isinstance(weights, str): weights = json.loads(weights)
+                yield str(profile.get('mode', '')).lower().strip(), preferences, weights
+            except (ValueError, AttributeError) as e:
+                yield f"could not parse profile: {e}"
+
+def _init_bulk_worker(db_path):
+    #EVERY WORKER LOADS THE DATA ONCE, NOT ONCE PER PROFILE
+    load_factors(load_feature_store(db_path), list(dict.fromkeys(VACATION_FACTORS + EMIGRATION_FACTORS)))
+
+def _score_chunk(profiles, top_n, db_path):
+    """One JSON line per profile of the chunk, in the same order."""
+    lines = [None] * len(profiles)
+    for mode in ['vacation', 'emigration']:
+        positions = [i for i, profile in enumerate(profiles) if isinstance(profile, tuple) and profile[0] == mode]
+        if not positions:
+            continue
+        try:
+            batches = [(positions, get_batch_recommendations(mode, [profiles[i][1:] for i in positions], top_n, db_path))]
+        except Exception:
+            #A MALFORMED PROFILE ONLY FAILS ITSELF, THE REST OF THE CHUNK IS SCORED ONE BY ONE
+            batches = []
+            for i in positions:
+                try:
+                    batches.append(([i], get_batch_recommendations(mode, [profiles[i][1:]], top_n, db_path)))
+                except Exception as e:
+                    lines[i] = {'error': f"could not score profile: {e}"}
+        for batch_positions, results in batches:
+            if results is None:
+                continue
+            for profile, group in results.groupby('profile'):
+                lines[batch_positions[profile]] = {'results': group[['Destination', 'Country', 'score']].to_dict('records')}
+    output = []
+    for profile, line in zip(profiles, lines):
+        if line is None:
+            if isinstance(profile, str):
+                line = {'error': profile}
+            elif profile[0] not in ('vacation', 'emigration'):
+                line = {'error': f"unknown mode '{profile[0]}'"}
+            else:
+                line = {'results': []}
+        output.append(json.dumps({'mode': profile[0] if isinstance(profile, tuple) else None, **line}, ensure_ascii=False))
+    return output
+
+def bulk_score(input_path, output, top_n=10, workers=None, db_path=DB_NAME):
+    """Scores a file of profiles on a process pool and writes the results to output as JSONL, in input order.
+
+    Only a few chunks per worker are in flight at any time, so memory does not grow with the size of the file.
+    """
+    def chunks():
+        chunk = []
+        for profile in read_profiles(input_path):
+            chunk.append(profile)
+            if len(chunk) == BULK_CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    scored = 0
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_bulk_worker, initargs=(db_path,)) as pool:
+        pending = deque()
+        for chunk in chunks():
+            pending.append(pool.submit(_score_chunk, chunk, top_n, db_path))
+            if len(pending) >= 2 * workers:
+                for line in pending.popleft().result():
+                    output.write(line + '\n')
+                    scored += 1
+        while pending:
+            for line in pending.popleft().result():
+                output.write(line + '\n')
+                scored += 1
+    return scored
+
+def bulk_main(argv):
+    parser = argparse.ArgumentParser(prog='recommender.py', description="Scores a JSONL or CSV file of profiles (mode, preferences, weights). "
+                                     "Without arguments the interactive mode is started.")
+    parser.add_argument('profiles', help="JSONL file, or CSV file whose preferences and weights columns hold JSON")
+    parser.add_argument('-o', '--output', default='-', help="JSONL output file (default: standard output)")
+    parser.add_argument('-n', '--top-n', type=int, default=10)
+    parser.add_argument('-w', '--workers', type=int, default=None, help="number of worker processes (default: number of CPUs)")
+    parser.add_argument('--db', default=DB_NAME, help="database file")
+    args = parser.parse_args(argv)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    try:
+        scored = bulk_score(args.profiles, output, args.top_n, args.workers, args.db)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"Scored {scored} profiles.", file=sys.stderr)
 
 #MAIN PROGRAM
-if __name__ == "__main__":
+if __name__ == "__main__" and len(sys.argv) > 1:
+    bulk_main(sys.argv[1:])
+elif __name__ == "__main__":
     #USER CHOOSES MODE
     choice = input("Choose recommendation mode ('vacation' or 'emigration'): ").lower().strip()
 
@@ -0,0 +1,243 @@
+import argparse
+import json
+import math
+import numbers
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pandas.errors import DatabaseError
+
+from recommender import (
+    DB_NAME, VACATION_FACTORS, EMIGRATION_FACTORS,
+    get_vacation_recommendations, get_emigration_recommendations,
+    load_feature_store, load_factors, get_cache_stats, enable_profiling, render_profile_metrics
+)
+
+#LOCAL HTTP/JSON RECOMMENDATION SERVICE
+#POST /vacation AND /emigration WITH {"preferences": {...}, "weights": {...}, "top_n": 10}, GET /metrics FOR PROMETHEUS
+RECOMMENDERS = {'vacation': get_vacation_recommendations, 'emigration': get_emigration_recommendations}
+#UPPER BOUNDS OF THE LATENCY HISTOGRAM IN SECONDS
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+MAX_BODY_BYTES = 1 << 20
+#TYPES OF THE PREFERENCES (None IS ALWAYS ALLOWED AND MEANS NOT CHOSEN, UNKNOWN PREFERENCES ARE IGNORED BY THE RECOMMENDER)
+LIST_PREFERENCES = ['attractions', 'known_languages', 'excluded_places']
+TEXT_PREFERENCES = ['month', 'weather']
+NUMBER_PREFERENCES = ['within_km', 'nearest']
+
+_METRICS_LOCK = threading.Lock()
+#(ENDPOINT) -> [BUCKET COUNTS..., +INF COUNT], SUM OF SECONDS AND (ENDPOINT, STATUS) -> REQUESTS
+_LATENCY_COUNTS = {}
+_LATENCY_SUMS = {}
+_REQUEST_COUNTS = {}
+#SUBMITTED TASKS WHICH HAVE NOT FINISHED (RUNNING OR QUEUED). A TASK WHICH TIMED OUT CANNOT BE STOPPED AND STAYS HERE UNTIL IT
+#FINISHES, SO THE NUMBER IS BOUNDED AND REQUESTS GET 503 WHEN IT IS REACHED INSTEAD OF WAITING BEHIND STUCK TASKS
+_TASKS_LOCK = threading.Lock()
+_PENDING_TASKS = set()
+
+
+#WORKERS
+def warm_up(db_path=DB_NAME):
+    """Loads the database and every factor, so requests never pay for it (also the initializer of worker processes)."""
+    load_factors(load_feature_store(db_path), list(dict.fromkeys(VACATION_FACTORS + EMIGRATION_FACTORS)))
+
+def recommend(mode, preferences, weights, top_n, db_path=DB_NAME):
+    """Recommendations as a list of {Destination, Country, score} records, None if the database could not be read."""
+    results = RECOMMENDERS[mode](preferences, weights, top_n=top_n, db_path=db_path)
+    if results is None:
+        return None
+    results = results.rename(columns={'Country_x': 'Country'})
+    return [{'Destination': row.Destination, 'Country': row.Country, 'score': float(row.score)} for row in results.itertuples()]
+
+
+#VALIDATION
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool) and math.isfinite(value)
+
+def validate_request(preferences, weights):
+    """Raises ValueError if a weight is not a number or a preference has the wrong type."""
+    for factor, weight in weights.items():
+        if not _is_number(weight):
+            raise ValueError(f'weight {factor} must be a number')
+    for key in LIST_PREFERENCES:
+        value = preferences.get(key)
+        if value is not None and not (isinstance(value, list) and all(isinstance(item, str) for item in value)):
+            raise ValueError(f'{key} must be a list of strings')
+    for key in TEXT_PREFERENCES:
+        if preferences.get(key) is not None and not isinstance(preferences[key], str):
+            raise ValueError(f'{key} must be a string')
+    for key in NUMBER_PREFERENCES:
+        if preferences.get(key) is not None and not _is_number(preferences[key]):
+            raise ValueError(f'{key} must be a number')
+    origin = preferences.get('origin')
+    if isinstance(origin, dict):
+        origin = [origin.get('lat'), origin.get('lon')]
+    if origin is not None and not isinstance(origin, str) and not (isinstance(origin, list) and len(origin) == 2 and all(map(_is_number, origin))):
+        raise ValueError('origin must be a destination name, {"lat": ..., "lon": ...} or [lat, lon]')
+
+
+#METRICS
+def observe(endpoint, status, seconds):
+    with _METRICS_LOCK:
+        counts = _LATENCY_COUNTS.setdefault(endpoint, [0] * (len(LATENCY_BUCKETS) + 1))
+        counts[next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))] += 1
+        _LATENCY_SUMS[endpoint] = _LATENCY_SUMS.get(endpoint, 0.0) + seconds
+        _REQUEST_COUNTS[(endpoint, status)] = _REQUEST_COUNTS.get((endpoint, status), 0) + 1
+
+def _task_done(future):
+    with _TASKS_LOCK:
+        _PENDING_TASKS.discard(future)
+
+def task_counts():
+    """Numbers of running and queued scoring tasks."""
+    with _TASKS_LOCK:
+        running = sum(future.running() for future in _PENDING_TASKS)
+        return running, len(_PENDING_TASKS) - running
+
+def render_metrics():
+    """Metrics in the Prometheus text format (the cache counters are the ones of this process)."""
+    lines = ['# HELP recommender_request_duration_seconds Time from receiving a request to sending the response.',
+             '# TYPE recommender_request_duration_seconds histogram']
+    with _METRICS_LOCK:
+        for endpoint, counts in sorted(_LATENCY_COUNTS.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + [math.inf], counts):
+                cumulative += count
+                le = '+Inf' if bound == math.inf else repr(bound)
+                lines.append(f'recommender_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{le}"}} {cumulative}')
+            lines.append(f'recommender_request_duration_seconds_sum{{endpoint="{endpoint}"}} {_LATENCY_SUMS[endpoint]}')
+            lines.append(f'recommender_request_duration_seconds_count{{endpoint="{endpoint}"}} {cumulative}')
+        lines += ['# HELP recommender_requests_total Requests by endpoint and HTTP status.', '# TYPE recommender_requests_total counter']
+        for (endpoint, status), count in sorted(_REQUEST_COUNTS.items()):
+            lines.append(f'recommender_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+    running, queued = task_counts()
+    lines += ['# HELP recommender_tasks_running Scoring tasks running in the pool (also ones whose request timed out).',
+              '# TYPE recommender_tasks_running gauge', f'recommender_tasks_running {running}',
+              '# HELP recommender_tasks_queued Scoring tasks waiting for a worker.',
+              '# TYPE recommender_tasks_queued gauge', f'recommender_tasks_queued {queued}',
+              '# TYPE recommender_tasks_max gauge', f'recommender_tasks_max {RecommendationHandler.max_pending}']
+    stats = get_cache_stats()
+    lines += ['# TYPE recommender_result_cache_hits_total counter', f"recommender_result_cache_hits_total {stats['hits']}",
+              '# TYPE recommender_result_cache_misses_total counter', f"recommender_result_cache_misses_total {stats['misses']}"]
+    #PER STAGE TOTALS, ONLY FILLED WHEN THE SERVER RUNS WITH --profile AND SCORES IN THREADS
+    return '\n'.join(lines) + '\n' + render_profile_metrics()
+
+
+#HTTP
+class RecommendationHandler(BaseHTTPRequestHandler):
+    #SET BY serve()
+    pool = None
+    timeout_seconds = 10.0
+    db_path = DB_NAME
+    max_pending = 16
+
+    def _send(self, status, body, content_type='application/json'):
+        data = (json.dumps(body) if content_type == 'application/json' else body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send(200, render_metrics(), 'text/plain; version=0.0.4')
+        elif self.path == '/health':
+            self._send(200, {'status': 'ok'})
+        else:
+            self._send(404, {'error': f'unknown endpoint {self.path}'})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        endpoint = self.path.strip('/')
+        status, body = self._handle(endpoint)
+        self._send(status, body)
+        if endpoint in RECOMMENDERS:
+            observe(endpoint, status, time.perf_counter() - start)
+
+    def _handle(self, endpoint):
+        if endpoint not in RECOMMENDERS:
+            return 404, {'error': f'unknown endpoint /{endpoint}'}
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            if length > MAX_BODY_BYTES:
+                return 413, {'error': 'request body too large'}
+            request = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(request, dict):
+                raise ValueError('the body must be a JSON object')
+            preferences, weights = request.get('preferences', {}), request.get('weights', {})
+            top_n = int(request.get('top_n', 10))
+            if not isinstance(preferences, dict) or not isinstance(weights, dict):
+                raise ValueError('preferences and weights must be objects')
+            validate_request(preferences, weights)
+        except (ValueError, TypeError, AttributeError) as e:
+            return 400, {'error': f'invalid request: {e}'}
+        with _TASKS_LOCK:
+            if len(_PENDING_TASKS) >= self.max_pending:
+                return 503, {'error': f'too many requests in progress ({self.max_pending}), try again later'}
+            future = self.pool.submit(recommend, endpoint, preferences, weights, top_n, self.db_path)
+            _PENDING_TASKS.add(future)
+        future.add_done_callback(_task_done)
+        try:
+            results = future.result(timeout=self.timeout_seconds)
+        except FutureTimeout:
+            #A QUEUED TASK IS CANCELLED, A RUNNING ONE CANNOT BE STOPPED: IT KEEPS ITS WORKER (AND ITS PLACE IN THE BOUNDED
+            #NUMBER OF PENDING TASKS) UNTIL IT FINISHES, AND ITS RESULT IS DROPPED
+            future.cancel()
+            return 504, {'error': f'scoring took longer than {self.timeout_seconds} s'}
+        except (OSError, sqlite3.Error, DatabaseError) as e:
+            return 503, {'error': f'could not load data from the database: {e}'}
+        except Exception as e:
+            return 500, {'error': f'scoring failed: {e}'}
+        if results is None:
+            return 503, {'error': 'could not load data from the database'}
+        return 200, {'mode': endpoint, 'results': results}
+
+    def log_message(self, format, *args):
+        #ACCESS LOG IS KEPT QUIET FOR LOAD TESTS, /metrics HAS THE NUMBERS
+        pass
+
+
+def serve(host='127.0.0.1', port=8000, workers=4, pool='thread', timeout=10.0, db_path=DB_NAME, profile=False, max_pending=None):
+    """Runs the service until interrupted, with at most max_pending (default 4 per worker) tasks running or queued."""
+    if profile:
+        enable_profiling()
+    if pool == 'process':
+        #EVERY WORKER LOADS ITS OWN COPY, THE PARENT ONLY HANDLES HTTP AND NEVER SCORES
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=warm_up, initargs=(db_path,))
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        #THE DATA IS LOADED BEFORE THE FIRST REQUEST (THREADS SHARE THIS COPY)
+        warm_up(db_path)
+    RecommendationHandler.pool = executor
+    RecommendationHandler.timeout_seconds = timeout
+    RecommendationHandler.db_path = db_path
+    RecommendationHandler.max_pending = max_pending or 4 * workers
+    server = ThreadingHTTPServer((host, port), RecommendationHandler)
+    print(f"Serving recommendations on http://{host}:{port} ({workers} {pool} workers, timeout {timeout} s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON travel recommendation service.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=4, help="size of the scoring pool")
+    parser.add_argument('--pool', choices=['thread', 'process'], default='thread',
+                        help="threads share one copy of the data, processes score in parallel with one copy each")
+    parser.add_argument('--timeout', type=float, default=10.0, help="seconds before a request gets 504")
+    parser.add_argument('--db', default=DB_NAME, help="database file")
+    parser.add_argument('--profile', action='store_true', help="time every scoring stage and add the totals to /metrics (thread pool only)")
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help="running and queued tasks before requests get 503 (default 4 per worker); a task whose request "
+                             "timed out keeps running and counts until it finishes")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.pool, args.timeout, args.db, args.profile, args.max_pending)
@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import sqlite3
+
+import pandas as pd
+
+from recommender import DB_NAME, compact_snapshot_tables, create_destination_indexes, get_database_version
+from snapshot import snapshot_path, write_snapshot
+
+#SPLITS THE DATABASE INTO REGIONAL SHARDS WITH THE SAME TABLES, SCORED TOGETHER BY get_sharded_recommendations
+#DESTINATIONS KEEP THEIR Destination_ID AND ORDER, SO THE SHARDS IN ORDER GIVE THE SAME RESULTS AS THE WHOLE DATABASE
+TABLES = ['destinations', 'attractions', 'destination_aggregates', 'destination_group_masks']
+
+
+def longitude_regions(db_path, n_shards):
+    """Splits the countries into n_shards bands of longitude (west to east) with about the same number of destinations."""
+    conn = sqlite3.connect(db_path)
+    try:
+        countries = pd.read_sql_query("SELECT Country, AVG(Longitude) AS Longitude, COUNT(*) AS Destinations FROM destinations "
+                                      "GROUP BY Country ORDER BY AVG(Longitude), Country", conn)
+    finally:
+        conn.close()
+    band = (countries['Destinations'].cumsum().shift(fill_value=0) * n_shards // countries['Destinations'].sum()).astype(int)
+    return {f"region_{i + 1}": countries.loc[band == i, 'Country'].tolist() for i in range(n_shards) if (band == i).any()}
+
+def split_database(db_path, regions, output_dir=None, snapshot=False):
+    """Writes one database per region of {region: [countries]} next to db_path (or in output_dir), returns their paths."""
+    base = os.path.splitext(os.path.basename(db_path))[0]
+    output_dir = output_dir or os.path.dirname(os.path.abspath(db_path))
+    conn = sqlite3.connect(db_path)
+    schema = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table'").fetchall())
+    paths = []
+    try:
+        for region, countries in regions.items():
+            path = os.path.join(output_dir, f"{base}_{region}.db")
+            if os.path.exists(path):
+                os.remove(path)
+            #ROWS ARE COPIED INSIDE SQLITE, NOTHING IS LOADED INTO MEMORY
+            conn.execute("ATTACH DATABASE ? AS shard", (path,))
+            conn.execute("CREATE TEMP TABLE shard_countries (Country TEXT)")
+            conn.executemany("INSERT INTO shard_countries VALUES (?)", [(country,) for country in countries])
+            kept_ids = "SELECT Destination_ID FROM destinations WHERE Country IN (SELECT Country FROM shard_countries)"
+            filters = {'destinations': "Country IN (SELECT Country FROM shard_countries)",
+                       'attractions': "Country IN (SELECT Country FROM shard_countries)",
+                       'destination_aggregates': f"Destination_ID IN ({kept_ids})",
+                       'destination_group_masks': f"Destination_ID IN ({kept_ids})"}
+            for table in TABLES:
+                if table not in schema:
+                    continue
+                conn.execute(schema[table].replace(f'CREATE TABLE "{table}"', f'CREATE TABLE shard."{table}"', 1))
+                conn.execute(f'INSERT INTO shard."{table}" SELECT * FROM main."{table}" WHERE {filters[table]} ORDER BY rowid')
+            conn.commit()
+            conn.execute("DROP TABLE shard_countries")
+            conn.execute("DETACH DATABASE shard")
+            shard_conn = sqlite3.connect(path)
+            create_destination_indexes(shard_conn)
+            shard_conn.commit()
+            shard_conn.close()
+            if snapshot:
+                shard_conn = sqlite3.connect(path)
+                tables = {table: pd.read_sql_query(f"SELECT * FROM {table}", shard_conn) for table in TABLES if table in schema}
+                shard_conn.close()
+                write_snapshot(compact_snapshot_tables(tables), snapshot_path(path), get_database_version(path))
+            paths.append(path)
+    finally:
+        conn.close()
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Splits the database into regional shards.")
+    parser.add_argument('--db', default=DB_NAME, help="database file to split")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--shards', type=int, help="number of longitude bands")
+    group.add_argument('--regions', metavar='JSON', help='file with {"region": ["country", ...]}')
+    parser.add_argument('-o', '--output-dir', default=None, help="folder of the shards (default: next to the database)")
+    parser.add_argument('--snapshot', action='store_true', help="also write the columnar snapshot of every shard")
+    args = parser.parse_args()
+
+    if args.regions:
+        with open(args.regions, encoding='utf-8') as f:
+            regions = json.load(f)
+    else:
+        regions = longitude_regions(args.db, args.shards)
+    for path in split_database(args.db, regions, args.output_dir, args.snapshot):
+        print(path)
@@ -0,0 +1,193 @@
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from recommender import (
+    WEATHER_SCALE, ALL_ATTRACTION_GROUPS, MONTH_COLUMNS, DB_NAME, LODZ, haversine_km,
+    attraction_popularity_points, build_destination_aggregates, compact_snapshot_tables, create_destination_indexes, get_database_version
+)
+from snapshot import snapshot_path, write_snapshot
+
+#SYNTHETIC DATABASES WITH THE SAME TABLES AS database_creator.py, FOR SCALE TESTS OF THE RECOMMENDER
+#SCALE 1 IS THE SIZE OF THE REAL DATASET (104 DESTINATIONS, 30 ATTRACTIONS EACH)
+BASE_DESTINATIONS = 104
+BASE_ATTRACTIONS_PER_DESTINATION = 30
+#ATTRACTIONS ARE GENERATED AND WRITTEN FOR THIS MANY DESTINATIONS AT A TIME
+ATTRACTIONS_PER_CHUNK = 1_000_000
+
+#COLUMN ORDER OF THE destinations TABLE
+DESTINATION_COLUMNS = [
+    'Destination_ID', 'Destination', 'Country', 'HDI_Value_Latest', 'Life_Expectancy', 'GNI_per_capita_PPP',
+    'Inflation_Rate_National_Latest_Pct', 'Crime_Index', 'Safety_Index', 'Unemployment_Rate_National_Latest_Pct',
+    'English_EPI_Score', 'Cuisine_Rank'] + MONTH_COLUMNS + [
+    'Distance_from_Lodz_km_road', 'Overall_Daily_Cost_Budget_USD', 'Overall_Daily_Cost_MidRange_USD',
+    'Overall_Daily_Cost_Luxury_USD', 'Language', 'Number_of_ratings', 'CostofLivingIndex', 'RentIndex',
+    'CostofLivingPlusRentIndex', 'GroceriesIndex', 'RestaurantPriceIndex', 'LocalPurchasingPowerIndex',
+    'Latitude', 'Longitude', 'Popularity_TripAdvisor_Count']
+ATTRACTION_COLUMNS = ['Destination', 'Country', 'Name', 'Avg_rating', 'No_votes'] + ALL_ATTRACTION_GROUPS
+
+#LANGUAGES AND HOW OFTEN THEY ARE SPOKEN IN A COUNTRY (ROUGHLY AS IN THE REAL DATA)
+LANGUAGES = {'German': 13, 'French': 13, 'English': 12, 'Greek': 8, 'Italian': 8, 'Spanish': 6, 'Dutch': 5, 'Portuguese': 4,
+             'Czech': 4, 'Croatian': 3, 'Polish': 3, 'Swedish': 2, 'Norwegian': 2, 'Danish': 2, 'Finnish': 2, 'Hungarian': 2,
+             'Romanian': 2, 'Bulgarian': 2, 'Slovak': 1, 'Slovenian': 1, 'Albanian': 1, 'Serbian': 1, 'Turkish': 1, 'Catalan': 1}
+#SHARE OF ATTRACTIONS IN EVERY GROUP IN THE REAL DATA (TOP 200 IS GIVEN BY THE NUMBER OF VOTES INSTEAD)
+GROUP_SHARES = {'Historic_Heritage': 0.253, 'Religion': 0.066, 'Nature_Recreation': 0.306, 'Culture_Art': 0.189, 'Museums': 0.2,
+                'Entertainment_Leisure': 0.076, 'Shopping_Urban': 0.092, 'Food_Drink': 0.031, 'Winter_Sports': 0.014,
+                'Scenic_Transport': 0.038, 'Science_Technology': 0.014, 'Beach': 0.065, 'Mountains_and_trails': 0.031,
+                'Landmark': 0.258}
+#UPPER TEMPERATURE (C) OF EVERY STEP OF WEATHER_SCALE, THE LAST ONE IS OPEN
+WEATHER_TEMPERATURES = [-5, 2, 8, 14, 20, 25, 30]
+#VOTES ARE LOG-NORMAL WITH THE MEDIAN AND MEAN OF THE REAL DATA (ABOUT 1,400 AND 4,000)
+VOTES_MU, VOTES_SIGMA = 7.22, 1.47
+ROAD_FACTOR = 1.3
+
+
+def generate_destinations(n, rng):
+    """Destinations table with n rows; countries share their language and national statistics."""
+    n_countries = max(1, round(n / 2.6))
+    country = np.sort(rng.integers(0, n_countries, n))
+    #ONE LATENT WEALTH LEVEL PER COUNTRY DRIVES INCOME, PRICES AND DEVELOPMENT TOGETHER
+    wealth = rng.normal(0, 1, n_countries)
+    w = wealth[country]
+    languages = np.array(list(LANGUAGES))
+    language = rng.choice(languages, n_countries, p=np.array(list(LANGUAGES.values())) / sum(LANGUAGES.values()))[country]
+    lat = np.clip(rng.normal(47.4, 7.2, n), 28, 71)
+    lon = np.clip(rng.normal(9.7, 11.4, n), -26, 32)
+
+    #MONTHLY TEMPERATURE: COLDER AND MORE SEASONAL TO THE NORTH, PEAK IN JULY, PLUS A LOCAL OFFSET
+    months = np.arange(12)
+    mean_temp = 34 - 0.45 * lat + rng.normal(0, 2, n)
+    amplitude = np.clip(9 + 0.2 * (lat - 35), 4, 16)
+    temperature = mean_temp[:, None] + amplitude[:, None] * np.cos(2 * np.pi * (months[None, :] - 6) / 12)
+    weather = np.array(WEATHER_SCALE)[np.searchsorted(WEATHER_TEMPERATURES, temperature + rng.normal(0, 1.5, temperature.shape))]
+
+    mid_range = np.clip(rng.lognormal(np.log(186) + 0.25 * w, 0.2), 60, 500).round()
+    crime = np.clip(rng.normal(38.7 - 4 * w, 8), 10, 80).round(1)
+    cost_of_living = np.clip(63.8 + 15 * w + rng.normal(0, 5, n), 25, 130).round(1)
+    rent = np.clip(31.8 + 12 * w + rng.normal(0, 5, n), 5, 90).round(1)
+    distance = (haversine_km(lat, lon, *LODZ) * ROAD_FACTOR / 25).round() * 25
+    #ISLANDS AND FAR AWAY PLACES HAVE NO ROAD DISTANCE
+    distance[rng.random(n) < 0.17] = np.nan
+    ratings = rng.lognormal(11.1, 1.0, n).round()
+    cuisine = rng.integers(1, 101, n)
+
+    df = pd.DataFrame({
+        'Destination_ID': np.arange(n),
+        'Destination': [f"Destination {i:06d}" for i in range(n)],
+        'Country': [f"Country {c:05d}" for c in country],
+        'HDI_Value_Latest': np.clip(0.906 + 0.04 * w, 0.7, 0.99).round(3),
+        'Life_Expectancy': np.clip(80.6 + 2.5 * w + rng.normal(0, 1, n_countries)[country], 65, 88).round(1),
+        'GNI_per_capita_PPP': np.clip(46600 + 14000 * w, 10000, 120000).round(),
+        'Inflation_Rate_National_Latest_Pct': np.clip(rng.lognormal(0.9, 0.6, n_countries)[country], 0.1, 40).round(2),
+        'Crime_Index': crime,
+        'Safety_Index': (100 - crime).round(1),
+        'Unemployment_Rate_National_Latest_Pct': np.clip(rng.lognormal(1.7, 0.45, n_countries)[country], 1, 25).round(2),
+        'English_EPI_Score': np.clip(581 + 30 * w + rng.normal(0, 25, n_countries)[country], 450, 680).round().astype(int),
+        'Cuisine_Rank': cuisine,
+        **{month: weather[:, i] for i, month in enumerate(MONTH_COLUMNS)},
+        'Distance_from_Lodz_km_road': distance,
+        'Overall_Daily_Cost_Budget_USD': (mid_range * 0.42).round().astype(int),
+        'Overall_Daily_Cost_MidRange_USD': mid_range.astype(int),
+        'Overall_Daily_Cost_Luxury_USD': (mid_range * 2.3).round().astype(int),
+        'Language': language,
+        'Number_of_ratings': ratings.astype(int),
+        'CostofLivingIndex': cost_of_living,
+        'RentIndex': rent,
+        'CostofLivingPlusRentIndex': ((cost_of_living + rent) / 2).round(1),
+        'GroceriesIndex': np.clip(cost_of_living + rng.normal(-2, 6, n), 20, 130).round(1),
+        'RestaurantPriceIndex': np.clip(cost_of_living + rng.normal(0, 6, n), 20, 130).round(1),
+        'LocalPurchasingPowerIndex': np.clip(105 + 28 * w + rng.normal(0, 10, n), 30, 200).round(1),
+        'Latitude': lat.round(4),
+        'Longitude': lon.round(4),
+        'Popularity_TripAdvisor_Count': ratings.astype(int),
+    })
+    return df[DESTINATION_COLUMNS]
+
+def attractions_per_destination(n_destinations, n_attractions, rng):
+    """Number of attractions of every destination (popular places have many more), summing to n_attractions."""
+    weights = rng.lognormal(0, 0.8, n_destinations)
+    return rng.multinomial(n_attractions, weights / weights.sum())
+
+def generate_attractions(destinations, counts, no_votes, top_200_threshold, first_id, rng):
+    """Attractions of the given destinations, using the already drawn vote counts."""
+    m = int(counts.sum())
+    dest_rows = np.repeat(np.arange(len(destinations)), counts)
+    flags = rng.random((m, len(GROUP_SHARES))) < np.array(list(GROUP_SHARES.values()))
+    #EVERY ATTRACTION HAS AT LEAST ONE GROUP
+    empty = np.flatnonzero(~flags.any(axis=1))
+    shares = np.array(list(GROUP_SHARES.values()))
+    flags[empty, rng.choice(len(GROUP_SHARES), len(empty), p=shares / shares.sum())] = True
+    df = pd.DataFrame({
+        'Destination': destinations['Destination'].to_numpy()[dest_rows],
+        'Country': destinations['Country'].to_numpy()[dest_rows],
+        'Name': [f"Attraction {i:08d}" for i in range(first_id, first_id + m)],
+        #MOST RATINGS ARE 4.3 - 4.6, FEW BELOW 4
+        'Avg_rating': np.clip(rng.normal(4.45, 0.26, m), 1, 5).round(1),
+        'No_votes': no_votes,
+        **{group: flags[:, i].astype(int) for i, group in enumerate(GROUP_SHARES)},
+        'Top_200_Popular': (no_votes >= top_200_threshold).astype(int),
+    })
+    return df[ATTRACTION_COLUMNS]
+
+def generate_database(db_path, n_destinations, n_attractions, seed=0, snapshot=False):
+    """Writes a synthetic database with the tables of database_creator.py, attractions are written in chunks."""
+    rng = np.random.default_rng(seed)
+    destinations = generate_destinations(n_destinations, rng)
+    counts = attractions_per_destination(n_destinations, n_attractions, rng)
+    #VOTES ARE DRAWN FOR ALL ATTRACTIONS FIRST: THE TOP 200 FLAG AND THE POPULARITY POINTS DEPEND ON THE RANK AMONG ALL OF THEM
+    no_votes = np.maximum(rng.lognormal(VOTES_MU, VOTES_SIGMA, n_attractions).round(), 1).astype(np.int64)
+    top_200_threshold = np.partition(no_votes, -200)[-200] if n_attractions >= 200 else no_votes.min(initial=0)
+    popularity = attraction_popularity_points(no_votes).to_numpy()
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        destinations.to_sql('destinations', conn, index=False)
+        ends = np.cumsum(counts)
+        start_dest, start_attr = 0, 0
+        while start_dest < n_destinations:
+            #AS MANY WHOLE DESTINATIONS AS FIT IN ONE CHUNK (AT LEAST ONE)
+            end_dest = max(start_dest + 1, int(np.searchsorted(ends, start_attr + ATTRACTIONS_PER_CHUNK, side='right')))
+            end_attr = int(ends[end_dest - 1])
+            dest_chunk = destinations.iloc[start_dest:end_dest]
+            attr_chunk = generate_attractions(dest_chunk, counts[start_dest:end_dest], no_votes[start_attr:end_attr],
+                                              top_200_threshold, start_attr, rng)
+            aggregates, group_masks = build_destination_aggregates(dest_chunk, attr_chunk, popularity[start_attr:end_attr])
+            attr_chunk.to_sql('attractions', conn, index=False, if_exists='append')
+            aggregates.to_sql('destination_aggregates', conn, index=False, if_exists='append')
+            group_masks.to_sql('destination_group_masks', conn, index=False, if_exists='append')
+            conn.commit()
+            start_dest, start_attr = end_dest, end_attr
+        create_destination_indexes(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    if snapshot:
+        conn = sqlite3.connect(db_path)
+        tables = {table: pd.read_sql_query(f"SELECT * FROM {table}", conn)
+                  for table in ['destinations', 'attractions', 'destination_aggregates', 'destination_group_masks']}
+        conn.close()
+        write_snapshot(compact_snapshot_tables(tables), snapshot_path(db_path), get_database_version(db_path))
+    return db_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates a synthetic travel database with the schema of database_creator.py.")
+    parser.add_argument('-o', '--output', default="synthetic_" + DB_NAME, help="database file to write")
+    parser.add_argument('--scale', type=float, default=1.0, help="size relative to the real dataset (104 destinations, 30 attractions each)")
+    parser.add_argument('--destinations', type=int, help="number of destinations (overrides --scale)")
+    parser.add_argument('--attractions', type=int, help="number of attractions (overrides --scale)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--snapshot', action='store_true', help="also write the columnar snapshot (needs the tables in memory)")
+    args = parser.parse_args()
+
+    n_destinations = args.destinations or max(1, round(BASE_DESTINATIONS * args.scale))
+    n_attractions = args.attractions if args.attractions is not None else n_destinations * BASE_ATTRACTIONS_PER_DESTINATION
+    start = time.perf_counter()
+    generate_database(args.output, n_destinations, n_attractions, args.seed, args.snapshot)
+    print(f"Wrote {n_destinations} destinations and {n_attractions} attractions to {args.output} in {time.perf_counter() - start:.1f} s")
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from chatbot import classify_question, compile_keywords, find_entity_in_question, build_entity_matcher, get_chatbot_response
+
+#OVERLAPPING KEYWORDS OF THE INTENT ROUTER AND WHOLE-WORD ENTITY MATCHING
+
+
+def test_shorter_plain_keywords_inside_a_longer_one_are_found():
+    assert {'attraction', 'attraction quality'} <= classify_question("what is attraction quality?")
+    assert {'cost of living', 'safety'} <= classify_question("safety and cost of living")
+
+def test_pattern_does_not_hide_a_plain_keyword_at_the_same_position():
+    router = compile_keywords(['nearest city', 'hotel'], {'near': r'\bnear\b', 'nearish': r'\bnear\w*'})
+    assert classify_question("the nearest city", router) == {'nearest city', 'nearish'}
+    assert classify_question("a hotel near rome", router) == {'hotel', 'near', 'nearish'}
+
+def test_every_pattern_matching_at_a_position_is_found():
+    router = compile_keywords(['x'], {'short': r'close', 'long': r'close to'})
+    assert classify_question("close to rome", router) == {'short', 'long'}
+
+def test_greetings_are_whole_words():
+    assert 'hello' in classify_question("hello there!")
+    assert 'hello' in classify_question("hellooo")
+    assert 'hey' in classify_question("heyyy, help")
+    assert not classify_question("which city is this?") & {'hello', 'hi', 'hey'}
+    assert classify_question("destinations within 300 km of vienna") == {'within'}
+
+def test_radius_and_nearby_keywords():
+    assert 'near' in classify_question("what is nearby?")
+    assert 'near' not in classify_question("the nearest beach")
+
+def test_entities_are_matched_as_whole_words():
+    matcher = build_entity_matcher(['Nice', 'Rome', 'Rome Airport'])
+    assert find_entity_in_question("I like it nicely", matcher) is None
+    assert find_entity_in_question("Trip to Nice!", matcher) == 'Nice'
+    assert find_entity_in_question("Flights to rome airport?", matcher) == 'Rome Airport'
+    assert find_entity_in_question("Romeo and Juliet", matcher) is None
+
+def test_near_a_destination_without_neighbours():
+    #THE ONLY OTHER DESTINATION HAS NO COORDINATES, SO NOTHING IS NEAR ROME
+    dest = pd.DataFrame({'Destination': ['Rome', 'Atlantis'], 'Country': ['Italy', 'Nowhere'],
+                         'Latitude': [41.9, np.nan], 'Longitude': [12.5, np.nan]})
+    attr = pd.DataFrame({'Destination': [], 'Country': [], 'Name': []})
+    response = get_chatbot_response("what is near Rome?", dest, attr, ['Rome', 'Atlantis'], ['Italy', 'Nowhere'], [])
+    assert response == "There are no other destinations near **Rome**."
+    response = get_chatbot_response("destinations within 300 km of Rome", dest, attr, ['Rome', 'Atlantis'], ['Italy', 'Nowhere'], [])
+    assert response == "There are no other destinations within 300 km of **Rome**."
@@ -0,0 +1,95 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from recommender import (
+    VACATION_PRESETS, EMIGRATION_PRESETS, VACATION_FACTORS, EMIGRATION_FACTORS,
+    ScoringSession, get_vacation_recommendations, get_emigration_recommendations, load_feature_store,
+    clear_result_cache, get_cache_stats, build_spatial_index, within_radius, nearest_rows, haversine_km,
+    read_table, memory_report, apply_compact_schema, COMPACT_SCHEMA, DB_NAME
+)
+
+#THE SESSION AFTER ANY SEQUENCE OF SLIDER MOVES MUST GIVE EXACTLY THE RESULTS OF A FRESH CALL, TIES INCLUDED
+#(THE RESULT CACHE IS SHARED BY BOTH, SO IT IS CLEARED BEFORE EVERY COMPARISON)
+VACATION_PREFERENCES = {'month': 'July', 'weather': 'warm', 'attractions': ['Beach', 'Museums'], 'known_languages': ['English'],
+                        'excluded_places': []}
+EMIGRATION_PREFERENCES = {'weather': 'comfortable', 'known_languages': [], 'excluded_places': ['Poland']}
+CASES = [('vacation', VACATION_PREFERENCES, VACATION_PRESETS, VACATION_FACTORS, get_vacation_recommendations),
+         ('emigration', EMIGRATION_PREFERENCES, EMIGRATION_PRESETS, EMIGRATION_FACTORS, get_emigration_recommendations)]
+
+
+def _slider_moves(factors, weights, rng, moves):
+    """Weights after every move of one slider by a multiple of the 0.05 slider step."""
+    weights = dict(weights)
+    for _ in range(moves):
+        factor = factors[rng.integers(len(factors))]
+        weights[factor] = round(float(rng.integers(0, 21)) * 0.05, 2)
+        yield dict(weights)
+
+def test_session_matches_fresh_recommendations_after_slider_moves():
+    n = len(load_feature_store()['names'])
+    for mode, preferences, presets, factors, recommend in CASES:
+        rng = np.random.default_rng(0)
+        for weights in presets.values():
+            session = ScoringSession(mode, preferences, weights)
+            for moved in _slider_moves(factors, weights, rng, 25):
+                session.update(preferences, moved)
+                clear_result_cache()
+                results = session.top(n).reset_index(drop=True)
+                clear_result_cache()
+                pd.testing.assert_frame_equal(results, recommend(preferences, moved, top_n=n).reset_index(drop=True), check_exact=True)
+
+def test_session_ties_are_ordered_by_name():
+    #ONLY THE KNOWN LANGUAGES COUNT, SO WHOLE GROUPS OF DESTINATIONS HAVE EXACTLY THE SAME SCORE
+    preferences = dict(VACATION_PREFERENCES, known_languages=['Spanish'])
+    weights = dict.fromkeys(VACATION_FACTORS, 0.0)
+    session = ScoringSession('vacation', preferences, dict(weights, safety=0.35))
+    for weight in [0.1, 0.7, 0.15, 0.3]:
+        session.set_weight('known_languages', weight)
+    session.set_weight('safety', 0.0)
+    clear_result_cache()
+    results = session.top(len(load_feature_store()['names']))
+    clear_result_cache()
+    assert results['score'].nunique() < len(results)
+    for _, group in results.groupby('score', sort=False):
+        assert list(group['Destination']) == sorted(group['Destination'])
+    pd.testing.assert_frame_equal(results, get_vacation_recommendations(preferences, dict(weights, known_languages=0.3), top_n=len(results)))
+
+def test_session_shares_the_result_cache():
+    weights = EMIGRATION_PRESETS['Balanced']
+    clear_result_cache()
+    session = ScoringSession('emigration', EMIGRATION_PREFERENCES, weights)
+    results = session.top(10)
+    cached = get_emigration_recommendations(EMIGRATION_PREFERENCES, weights)
+    assert get_cache_stats()['hits'] == 1
+    pd.testing.assert_frame_equal(results, cached)
+
+def test_spatial_index_matches_brute_force_haversine():
+    #CELL SIZES WHICH DO AND DO NOT DIVIDE 360, POINTS AND QUERIES CROWDED AROUND THE ANTIMERIDIAN
+    rng = np.random.default_rng(1)
+    lat = rng.uniform(-85, 85, 3000)
+    lon = np.concatenate([rng.uniform(-180, 180, 1000), rng.uniform(170, 180, 1000), rng.uniform(-180, -170, 1000)])
+    lon[:3] = [180.0, -180.0, 179.999999]
+    for cell_degrees in [1.0, 7.0, 0.7, 5.0, 25.0, 13.3]:
+        index = build_spatial_index(lat, lon, cell_degrees)
+        for _ in range(40):
+            q_lat = rng.uniform(-80, 80)
+            q_lon = rng.choice([rng.uniform(-180, 180), rng.uniform(175, 180), rng.uniform(-180, -175), 180.0, -180.0])
+            radius = rng.choice([50.0, 300.0, 1500.0, 5000.0])
+            distances = haversine_km(lat, lon, q_lat, q_lon)
+            np.testing.assert_array_equal(within_radius(index, q_lat, q_lon, radius), np.flatnonzero(distances <= radius))
+            np.testing.assert_array_equal(nearest_rows(index, q_lat, q_lon, 7), np.lexsort((np.arange(len(lat)), distances))[:7])
+
+def test_snapshot_tables_are_compact_and_mapped():
+    #THE SNAPSHOT HAS THE COMPACT TYPES ITSELF, SO ITS SHARED PAGES ARE NOT BIGGER THAN THE PRIVATE COMPACT COPY FROM SQLITE
+    for table, schema in COMPACT_SCHEMA.items():
+        df = read_table(table)
+        assert df.attrs.get('memory_mapped')
+        assert all(str(df[col].dtype) == 'int8' for col, dtype in schema.items() if dtype == 'int8')
+        report = memory_report({table: df}).iloc[0]
+        assert report['mapped_bytes'] > 0
+        conn = sqlite3.connect(DB_NAME)
+        sqlite = apply_compact_schema(pd.read_sql_query(f"SELECT * FROM {table}", conn), table)
+        conn.close()
+        assert report['private_bytes'] <= sqlite.memory_usage(deep=True).sum()
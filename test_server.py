@@ -0,0 +1,51 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from recommender import VACATION_PRESETS, EMIGRATION_PRESETS, clear_result_cache
+from server import RecommendationHandler
+
+#REQUESTS OVER HTTP TO A SERVER ON A FREE PORT, SCORING IN A THREAD POOL
+VACATION_WEIGHTS = next(iter(VACATION_PRESETS.values()))
+EMIGRATION_WEIGHTS = next(iter(EMIGRATION_PRESETS.values()))
+
+
+@pytest.fixture(scope='module')
+def url():
+    RecommendationHandler.pool = ThreadPoolExecutor(max_workers=2)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RecommendationHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    RecommendationHandler.pool.shutdown()
+
+def _post(url, endpoint, body):
+    request = urllib.request.Request(f"{url}/{endpoint}", data=json.dumps(body).encode(), headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def test_null_text_preferences_mean_not_chosen(url):
+    preferences = {'known_languages': ['English'], 'excluded_places': []}
+    for endpoint, weights in [('vacation', VACATION_WEIGHTS), ('emigration', EMIGRATION_WEIGHTS)]:
+        clear_result_cache()
+        status, chosen = _post(url, endpoint, {'preferences': preferences, 'weights': weights})
+        assert status == 200
+        clear_result_cache()
+        status, null = _post(url, endpoint, {'preferences': {**preferences, 'month': None, 'weather': None}, 'weights': weights})
+        assert status == 200
+        assert null['results'] == chosen['results']
+
+def test_wrong_types_are_rejected(url):
+    for preferences, weights in [({'month': 7}, {}), ({'weather': ['warm']}, {}), ({'known_languages': 'English'}, {}),
+                                 ({}, {'safety': 'high'}), ({}, {'safety': True})]:
+        status, body = _post(url, 'vacation', {'preferences': preferences, 'weights': weights})
+        assert status == 400, body